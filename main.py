@@ -10,7 +10,12 @@ from provider.logging_filters import install_sensitive_data_filter
 
 install_sensitive_data_filter()
 
-plugin = Plugin(DifyPluginEnv(MAX_REQUEST_TIMEOUT=120))
+
+def _make_plugin() -> Plugin:
+    """プラグイン本体を生成する。import のみの場合は初期化コストを払わない."""
+    return Plugin(DifyPluginEnv(MAX_REQUEST_TIMEOUT=120))
+
 
 if __name__ == '__main__':
+    plugin = _make_plugin()
     plugin.run()
@@ -8,11 +8,17 @@ from __future__ import annotations
 
 import logging
 import re
+import threading
 from collections.abc import Mapping
 from typing import Any
 
 from dify_plugin.config.logger_format import plugin_logger_handler
 
+try:
+    import hyperscan
+except ImportError:  # pragma: no cover - hyperscan は任意依存
+    hyperscan = None
+
 MASK_TOKEN = "***REDACTED***"
 SENSITIVE_FIELD_NAMES = (
     "aws_access_key_id",
@@ -26,76 +32,303 @@ SENSITIVE_FIELD_NAMES = (
     "secret_key",
     "access_key",
 )
-_SENSITIVE_FIELD_SET = {name.lower() for name in SENSITIVE_FIELD_NAMES}
-_FIELD_PATTERN = "|".join(re.escape(name) for name in SENSITIVE_FIELD_NAMES)
+_SENSITIVE_FIELD_SET = frozenset(name.lower() for name in SENSITIVE_FIELD_NAMES)
 
-_QUOTED_FIELD_PATTERN = re.compile(
-    rf"(?P<prefix>\"?(?:{_FIELD_PATTERN})\"?\s*[:=]\s*)(?P<quote>[\"']) (?P<value>[^\"']+?)(?P=quote)",
-    flags=re.IGNORECASE | re.VERBOSE,
-)
-_UNQUOTED_FIELD_PATTERN = re.compile(
-    rf"(?P<prefix>\"?(?:{_FIELD_PATTERN})\"?\s*[:=]\s*)(?P<value>[^\s,}}]+)",
+
+def _build_trie_pattern(words: tuple[str, ...]) -> str:
+    """共通接頭辞をまとめたトライ形式の交替パターンを生成する.
+
+    例: ("access_key_id", "access_key") -> "access_key(?:_id)?"
+    """
+
+    trie: dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word.lower():
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def _emit(node: dict[str, dict]) -> str:
+        branches = [re.escape(char) + _emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if "" in node:
+            return f"(?:{'|'.join(branches)})?"
+        if len(branches) == 1:
+            return branches[0]
+        return f"(?:{'|'.join(branches)})"
+
+    return _emit(trie)
+
+
+_FIELD_PATTERN = _build_trie_pattern(SENSITIVE_FIELD_NAMES)
+
+_ACCESS_KEY_PREFIXES = ("A3T", "ABIA", "ACCA", "AGPA", "AIDA", "AKIA", "ANPA", "ANVA", "APKA", "ASIA")
+_ACCESS_KEY_VALUE_PATTERN = rf"\b(?:{'|'.join(_ACCESS_KEY_PREFIXES)})[0-9A-Z]{{16}}\b"
+
+# 引用符付き値・引用符なし値・アクセスキー ID の 3 種を 1 つの交替パターンにまとめ、
+# 文字列を 1 回の走査でマスクする。アクセスキー ID のみ大文字小文字を区別する。
+_SENSITIVE_PATTERN = re.compile(
+    rf"(?P<quoted>(?P<qprefix>\"?(?:{_FIELD_PATTERN})\"?\s*[:=]\s*)(?P<quote>[\"'])(?P<qvalue>[^\"']+?)(?P=quote))"
+    rf"|(?P<unquoted>(?P<uprefix>\"?(?:{_FIELD_PATTERN})\"?\s*[:=]\s*)(?P<uvalue>[^\s,}}]+))"
+    rf"|(?P<access_key>(?-i:{_ACCESS_KEY_VALUE_PATTERN}))",
     flags=re.IGNORECASE,
 )
-_ACCESS_KEY_VALUE_PATTERN = re.compile(r"\b(A3T|ABIA|ACCA|AGPA|AIDA|AKIA|ANPA|ANVA|APKA|ASIA)[0-9A-Z]{16}\b")
+# bytes をデコードせずに検査するための同一パターン (パターン自体は ASCII のみ)。
+_SENSITIVE_PATTERN_BYTES = re.compile(_SENSITIVE_PATTERN.pattern.encode("ascii"), flags=re.IGNORECASE)
+
+# 正規表現を走らせる前の安価な部分文字列チェック用。
+# すべての機密フィールド名は以下のいずれかを (小文字化後に) 含む。
+_FIELD_SENTINELS = ("aws_", "access_key", "secret_")
+
+
+# 同一メッセージ (リトライ時の tool_parameters など) を繰り返しマスクしないための小さな FIFO キャッシュ。
+# id() の再利用で別文字列に誤ヒットしないよう、キーは文字列そのものを使う。
+_MASK_CACHE: dict[str, str] = {}
+_MASK_CACHE_MAX_ENTRIES = 512
+_MASK_CACHE_MAX_LENGTH = 4096
+_MASK_CACHE_LOCK = threading.Lock()
+
+
+# hyperscan が導入されている場合のみ install_sensitive_data_filter() でコンパイルする。
+_HYPERSCAN_DATABASE: Any = None
+_HYPERSCAN_SCRATCH = threading.local()
+
+
+def _compile_hyperscan_database() -> Any:
+    """フィールド名の目印とアクセスキー ID 接頭辞を 1 つの hyperscan DB にまとめる."""
+
+    if hyperscan is None:
+        return None
+
+    expressions = [sentinel.encode() for sentinel in _FIELD_SENTINELS]
+    flags = [hyperscan.HS_FLAG_CASELESS] * len(expressions)
+    expressions.append(f"(?:{'|'.join(_ACCESS_KEY_PREFIXES)})".encode())
+    flags.append(0)
+
+    database = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    database.compile(
+        expressions=expressions,
+        ids=list(range(len(expressions))),
+        elements=len(expressions),
+        flags=flags,
+    )
+    return database
+
+
+def _hyperscan_may_contain_sensitive(message: str) -> bool:
+    """hyperscan で 1 回だけ走査し、目印のいずれかが現れるか判定する."""
+
+    scratch = getattr(_HYPERSCAN_SCRATCH, "value", None)
+    if scratch is None:
+        scratch = hyperscan.Scratch(_HYPERSCAN_DATABASE)
+        _HYPERSCAN_SCRATCH.value = scratch
+
+    matched: list[int] = []
+
+    def _on_match(pattern_id: int, start: int, end: int, flags: int, context: Any) -> None:
+        matched.append(pattern_id)
+
+    _HYPERSCAN_DATABASE.scan(
+        message.encode("utf-8", errors="ignore"),
+        match_event_handler=_on_match,
+        scratch=scratch,
+    )
+    return bool(matched)
+
+
+def _may_contain_sensitive(message: str) -> bool:
+    """マスク対象になり得る文字列かを部分文字列検索だけで判定する."""
+
+    if _HYPERSCAN_DATABASE is not None:
+        return _hyperscan_may_contain_sensitive(message)
+
+    if any(prefix in message for prefix in _ACCESS_KEY_PREFIXES):
+        return True
+    lowered = message.lower()
+    return any(sentinel in lowered for sentinel in _FIELD_SENTINELS)
+
+
+def _replace_with_mask(match: re.Match[str]) -> str:
+    """交替パターンのどの分岐に一致したかに応じて置換文字列を返す."""
+
+    kind = match.lastgroup
+    if kind == "quoted":
+        if match.group("qvalue") == MASK_TOKEN:
+            return match.group(0)
+        quote = match.group("quote")
+        return f"{match.group('qprefix')}{quote}{MASK_TOKEN}{quote}"
+    if kind == "unquoted":
+        if match.group("uvalue") == MASK_TOKEN:
+            return match.group(0)
+        return f"{match.group('uprefix')}{MASK_TOKEN}"
+    return MASK_TOKEN
 
 
 def mask_sensitive_text(message: str) -> str:
     """文字列内の機密値をマスクする."""
 
-    if not message:
+    if not message or not _may_contain_sensitive(message):
         return message
 
-    def _replace_with_mask(match: re.Match[str]) -> str:
-        value = match.group("value")
-        if value == MASK_TOKEN:
-            return match.group(0)
-        quote = match.groupdict().get("quote", "")
-        return f"{match.group('prefix')}{quote}{MASK_TOKEN}{quote}"
+    cacheable = len(message) < _MASK_CACHE_MAX_LENGTH
+    if cacheable:
+        cached = _MASK_CACHE.get(message)
+        if cached is not None:
+            return cached
 
-    masked = _QUOTED_FIELD_PATTERN.sub(_replace_with_mask, message)
-    masked = _UNQUOTED_FIELD_PATTERN.sub(
-        lambda m: m.group(0) if m.group("value") == MASK_TOKEN else f"{m.group('prefix')}{MASK_TOKEN}",
-        masked,
-    )
-    masked = _ACCESS_KEY_VALUE_PATTERN.sub(MASK_TOKEN, masked)
+    masked = _SENSITIVE_PATTERN.sub(_replace_with_mask, message)
+
+    if cacheable:
+        with _MASK_CACHE_LOCK:
+            if len(_MASK_CACHE) >= _MASK_CACHE_MAX_ENTRIES:
+                _MASK_CACHE.pop(next(iter(_MASK_CACHE)))
+            _MASK_CACHE[message] = masked
     return masked
 
 
-def scrub_sensitive_data(data: Any) -> Any:
-    """辞書やリストを再帰的に走査し、機密キーのみマスクしたコピーを返す."""
-
-    if isinstance(data, Mapping):
-        sanitized: dict[Any, Any] = {}
-        for key, value in data.items():
-            key_lower = key.lower() if isinstance(key, str) else None
-            if key_lower and key_lower in _SENSITIVE_FIELD_SET:
-                sanitized[key] = MASK_TOKEN
-            else:
-                sanitized[key] = scrub_sensitive_data(value)
-        return sanitized
+def _is_sensitive_key(key: Any) -> bool:
+    """辞書キーが機密フィールド名か判定する。小文字キーでは lower() を呼ばない."""
+
+    if not isinstance(key, str):
+        return False
+    if key in _SENSITIVE_FIELD_SET:
+        return True
+    return not key.islower() and key.lower() in _SENSITIVE_FIELD_SET
+
+
+def _scrub_leaf(data: Any) -> Any:
+    """コンテナ以外の値をマスクする。変更が無ければ元のオブジェクトを返す.
 
-    if isinstance(data, (list, tuple, set)):
-        sanitized_items = [scrub_sensitive_data(item) for item in data]
-        if isinstance(data, tuple):
-            return tuple(sanitized_items)
-        if isinstance(data, set):
-            return set(sanitized_items)
-        return sanitized_items
+    bytes は一致がある場合のみデコードし、マスク済みの str を返す。
+    """
 
     if isinstance(data, bytes):
+        if _SENSITIVE_PATTERN_BYTES.search(data) is None:
+            return data
         data = data.decode("utf-8", errors="ignore")
 
     if isinstance(data, str):
-        return mask_sensitive_text(data)
+        masked = mask_sensitive_text(data)
+        return data if masked == data else masked
 
     return data
 
 
+def _is_mapping(data: Any) -> bool:
+    return type(data) is dict or isinstance(data, Mapping)
+
+
+def _is_container(data: Any) -> bool:
+    return _is_mapping(data) or isinstance(data, (list, tuple, set))
+
+
+class _ScrubFrame:
+    """scrub_sensitive_data の明示的スタックに積む 1 コンテナ分の走査状態."""
+
+    __slots__ = ("source", "is_mapping", "items", "entries", "changed", "pending_key")
+
+    def __init__(self, source: Any) -> None:
+        self.source = source
+        self.is_mapping = _is_mapping(source)
+        self.items = iter(source.items()) if self.is_mapping else iter(source)
+        self.entries: list[Any] = []
+        self.changed = False
+        self.pending_key: Any = None
+
+    def add(self, key: Any, original: Any, sanitized: Any) -> None:
+        if sanitized is not original:
+            self.changed = True
+        self.entries.append((key, sanitized) if self.is_mapping else sanitized)
+
+    def build(self) -> Any:
+        source = self.source
+        if not self.changed:
+            return source
+        if self.is_mapping:
+            return dict(self.entries)
+        if isinstance(source, tuple):
+            return tuple(self.entries)
+        if isinstance(source, set):
+            return set(self.entries)
+        return self.entries
+
+
+def scrub_sensitive_data(data: Any) -> Any:
+    """辞書やリストを走査し、機密キーのみマスクしたコピーを返す.
+
+    何もマスクされなかったコンテナや文字列は、コピーせず元のオブジェクトをそのまま返す。
+    深くネストした boto3 レスポンスでも関数呼び出しを積まないよう、再帰ではなく
+    明示的なスタックで走査する。循環参照は走査せずそのまま残す。
+    """
+
+    if not _is_container(data):
+        return _scrub_leaf(data)
+
+    stack = [_ScrubFrame(data)]
+    active_ids = {id(data)}
+    while True:
+        frame = stack[-1]
+        descended = False
+        for item in frame.items:
+            if frame.is_mapping:
+                key, value = item
+                if _is_sensitive_key(key):
+                    already_masked = isinstance(value, str) and value == MASK_TOKEN
+                    frame.add(key, value, value if already_masked else MASK_TOKEN)
+                    continue
+            else:
+                key, value = None, item
+
+            if _is_container(value) and id(value) not in active_ids:
+                frame.pending_key = key
+                stack.append(_ScrubFrame(value))
+                active_ids.add(id(value))
+                descended = True
+                break
+            frame.add(key, value, value if _is_container(value) else _scrub_leaf(value))
+
+        if descended:
+            continue
+
+        stack.pop()
+        active_ids.discard(id(frame.source))
+        result = frame.build()
+        if not stack:
+            return result
+        parent = stack[-1]
+        parent.add(parent.pending_key, frame.source, result)
+
+
 class SensitiveDataFilter(logging.Filter):
     """logging.Filter 実装。record を書き出す前にマスクを適用する."""
 
+    def __init__(self, name: str = "") -> None:
+        super().__init__(name)
+        self._handlers: list[logging.Handler] = []
+
+    def watch_handler(self, handler: logging.Handler) -> None:
+        """出力レベルの判定対象にハンドラを加える (ルートロガー以外に付いているもの用)."""
+
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+
+    def _minimum_output_level(self) -> int:
+        """record を実際に出力し得るハンドラのうち最も低いレベルを返す.
+
+        ハンドラのレベルは実行中に変わり得るため、キャッシュせず毎回読み直す
+        (ハンドラ数は数個なので正規表現より十分安い)。
+        """
+
+        handlers = logging.getLogger().handlers or [logging.lastResort]
+        levels = [handler.level for handler in (*handlers, *self._handlers) if handler is not None]
+        return min(levels, default=logging.NOTSET)
+
     def filter(self, record: logging.LogRecord) -> bool:  # noqa: D401
+        # どのハンドラにも出力されない record はマスクしても無駄なのでそのまま通す
+        if record.levelno < self._minimum_output_level():
+            return True
+
         record.msg = scrub_sensitive_data(record.msg)
         if record.args:
             record.args = scrub_sensitive_data(record.args)
@@ -113,11 +346,17 @@ _FILTER_INSTANCE: SensitiveDataFilter | None = None
 def install_sensitive_data_filter() -> SensitiveDataFilter:
     """プラグインのストリームハンドラとルートロガーにフィルターを一度だけ組み込む."""
 
-    global _FILTER_INSTANCE
+    global _FILTER_INSTANCE, _HYPERSCAN_DATABASE
     if _FILTER_INSTANCE is not None:
         return _FILTER_INSTANCE
 
+    try:
+        _HYPERSCAN_DATABASE = _compile_hyperscan_database()
+    except Exception:  # pragma: no cover - 失敗時は純 Python の判定にフォールバック
+        _HYPERSCAN_DATABASE = None
+
     _FILTER_INSTANCE = SensitiveDataFilter()
     logging.getLogger().addFilter(_FILTER_INSTANCE)
     plugin_logger_handler.addFilter(_FILTER_INSTANCE)
+    _FILTER_INSTANCE.watch_handler(plugin_logger_handler)
     return _FILTER_INSTANCE
@@ -1,8 +1,39 @@
 import boto3
+import inspect
 import json
-from collections.abc import Iterable
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from collections.abc import Hashable, Iterable
+from functools import lru_cache
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from typing import Optional, Dict, Any, Union, Tuple
+from typing import Optional, Dict, Any, List, Union, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+SSM_GET_PARAMETERS_MAX_NAMES = 10
+PARAMETER_CACHE_TTL_SECONDS = 60.0
+MISSING_PARAMETER_CACHE_TTL_SECONDS = 30.0
+PARAMETER_CACHE_MAX_ENTRIES = 256
+
+# botocore defaults to 10 pooled connections per client, which overflows under
+# parallel workflow fan-out and forces a fresh TLS handshake per extra request.
+DEFAULT_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_MAX_POOL', '50'))
+# Keep-alive sockets and a wider pool let warm invocations reuse TLS connections.
+DEFAULT_CLIENT_CONFIG = Config(
+    max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS,
+    retries={'mode': 'standard', 'max_attempts': 3},
+    tcp_keepalive=True,
+    connect_timeout=3,
+    read_timeout=60,
+)
 
 
 class ParameterStoreManager:
@@ -14,11 +45,44 @@ class ParameterStoreManager:
         aws_access_key_id: Optional[str] = None,
         aws_secret_access_key: Optional[str] = None,
     ):
-        client_kwargs: Dict[str, Any] = {'region_name': region_name}
-        if aws_access_key_id and aws_secret_access_key:
-            client_kwargs['aws_access_key_id'] = aws_access_key_id
-            client_kwargs['aws_secret_access_key'] = aws_secret_access_key
-        self.ssm_client = boto3.client('ssm', **client_kwargs)
+        self.ssm_client = get_cached_client('ssm', {
+            'aws_access_key_id': aws_access_key_id,
+            'aws_secret_access_key': aws_secret_access_key,
+            'aws_region': region_name,
+        })
+        # (name, decrypt) -> (expires_at, raw value or None)
+        self._parameter_cache: Dict[Tuple[str, bool], Tuple[float, Optional[str]]] = {}
+
+    @staticmethod
+    def _parse_value(value: Optional[str], as_dict: bool) -> Optional[Union[str, Dict]]:
+        if value is None or not as_dict:
+            return value
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+
+    def _get_cached_value(self, name: str, decrypt: bool) -> Tuple[bool, Optional[str]]:
+        entry = self._parameter_cache.get((name, decrypt))
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._parameter_cache[(name, decrypt)]
+            return False, None
+        return True, value
+
+    def _cache_value(self, name: str, decrypt: bool, value: Optional[str]) -> None:
+        # Misses expire sooner so a parameter created elsewhere shows up quickly.
+        ttl = PARAMETER_CACHE_TTL_SECONDS if value is not None else MISSING_PARAMETER_CACHE_TTL_SECONDS
+        if len(self._parameter_cache) >= PARAMETER_CACHE_MAX_ENTRIES:
+            self._parameter_cache.pop(next(iter(self._parameter_cache)))
+        self._parameter_cache[(name, decrypt)] = (time.monotonic() + ttl, value)
+
+    def invalidate(self, name: str) -> None:
+        """Drop cached hits and misses for a parameter name"""
+        self._parameter_cache.pop((name, True), None)
+        self._parameter_cache.pop((name, False), None)
     
     def get_parameter(self, name: str, decrypt: bool = True, as_dict: bool = False) -> Optional[Union[str, Dict]]:
         """
@@ -32,23 +96,72 @@ class ParameterStoreManager:
         Returns:
             Parameter value (string or dict) or None if not found
         """
+        hit, value = self._get_cached_value(name, decrypt)
+        if hit:
+            return self._parse_value(value, as_dict)
+
         try:
             response = self.ssm_client.get_parameter(
                 Name=name,
                 WithDecryption=decrypt
             )
             value = response['Parameter']['Value']
-            
-            if as_dict:
-                try:
-                    return json.loads(value)
-                except json.JSONDecodeError:
-                    return value
-            return value
+            self._cache_value(name, decrypt, value)
+            return self._parse_value(value, as_dict)
         except ClientError as e:
             if e.response['Error']['Code'] == 'ParameterNotFound':
+                self._cache_value(name, decrypt, None)
                 return None
             raise e
+
+    def get_parameters(self, names: List[str], decrypt: bool = True, as_dict: bool = False) -> Dict[str, Any]:
+        """
+        Get multiple parameters, batching up to 10 names per GetParameters call
+
+        Args:
+            names: Parameter names
+            decrypt: Whether to decrypt SecureString parameters
+            as_dict: Whether to parse JSON strings as dict
+
+        Returns:
+            Mapping of name to value; names that do not exist map to None
+        """
+        results: Dict[str, Any] = {}
+        pending: List[str] = []
+        for name in dict.fromkeys(names):
+            hit, value = self._get_cached_value(name, decrypt)
+            if hit:
+                results[name] = self._parse_value(value, as_dict)
+            else:
+                pending.append(name)
+
+        for start in range(0, len(pending), SSM_GET_PARAMETERS_MAX_NAMES):
+            chunk = pending[start:start + SSM_GET_PARAMETERS_MAX_NAMES]
+            response = self.ssm_client.get_parameters(Names=chunk, WithDecryption=decrypt)
+            for parameter in response.get('Parameters', []):
+                self._cache_value(parameter['Name'], decrypt, parameter['Value'])
+                results[parameter['Name']] = self._parse_value(parameter['Value'], as_dict)
+            for invalid_name in response.get('InvalidParameters', []):
+                self._cache_value(invalid_name, decrypt, None)
+                results[invalid_name] = None
+
+        return {name: results.get(name) for name in names}
+
+    def get_parameters_by_path(
+        self,
+        path: str,
+        recursive: bool = True,
+        decrypt: bool = True,
+        as_dict: bool = False,
+    ) -> Dict[str, Any]:
+        """Get every parameter under a path prefix using the GetParametersByPath paginator"""
+        results: Dict[str, Any] = {}
+        paginator = self.ssm_client.get_paginator('get_parameters_by_path')
+        for page in paginator.paginate(Path=path, Recursive=recursive, WithDecryption=decrypt):
+            for parameter in page.get('Parameters', []):
+                self._cache_value(parameter['Name'], decrypt, parameter['Value'])
+                results[parameter['Name']] = self._parse_value(parameter['Value'], as_dict)
+        return results
     
     def put_parameter(self, name: str, value: Union[str, Dict, Any], parameter_type: str = 'String', 
                      overwrite: bool = True, description: str = '') -> bool:
@@ -77,6 +190,7 @@ class ParameterStoreManager:
                 Overwrite=overwrite,
                 Description=description
             )
+            self.invalidate(name)
             return True
         except (ClientError, json.JSONEncodeError):
             return False
@@ -85,6 +199,7 @@ class ParameterStoreManager:
         """Delete parameter from Parameter Store"""
         try:
             self.ssm_client.delete_parameter(Name=name)
+            self.invalidate(name)
             return True
         except ClientError:
             return False
@@ -93,24 +208,80 @@ class ParameterStoreManager:
 CredentialSignature = Tuple[Optional[str], Optional[str], Optional[str]]
 
 
-def resolve_aws_credentials(tool: Any, tool_parameters: Dict[str, Any]) -> Dict[str, Optional[str]]:
-    """Merge provider-level credentials with tool parameters, preferring tool-specific inputs."""
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire ttl seconds after being stored"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_RUNTIME_CREDENTIALS_CACHE_ATTR = '_runtime_credentials_cache'
+
+
+def _runtime_credential_values(tool: Any) -> CredentialSignature:
+    """Extract (AK, SK, region) from provider credentials once per runtime credentials object.
+
+    The extracted tuple is memoized on the tool together with a reference to the source
+    mapping, so it is rebuilt only when the runtime hands the tool a different mapping.
+    """
     runtime_credentials = getattr(getattr(tool, 'runtime', None), 'credentials', {}) or {}
+    cached = getattr(tool, _RUNTIME_CREDENTIALS_CACHE_ATTR, None)
+    if cached is not None and cached[0] is runtime_credentials:
+        return cached[1]
+
+    values = (
+        runtime_credentials.get('aws_access_key_id'),
+        runtime_credentials.get('aws_secret_access_key'),
+        runtime_credentials.get('aws_region'),
+    )
+    try:
+        setattr(tool, _RUNTIME_CREDENTIALS_CACHE_ATTR, (runtime_credentials, values))
+    except AttributeError:
+        pass
+    return values
 
-    aws_access_key_id = tool_parameters.get('aws_access_key_id') or runtime_credentials.get('aws_access_key_id')
-    aws_secret_access_key = tool_parameters.get('aws_secret_access_key') or runtime_credentials.get('aws_secret_access_key')
-    aws_region = tool_parameters.get('aws_region') or runtime_credentials.get('aws_region') or 'us-east-1'
 
+def resolve_aws_credentials(tool: Any, tool_parameters: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Merge provider-level credentials with tool parameters, preferring tool-specific inputs."""
+    runtime_access_key_id, runtime_secret_access_key, runtime_region = _runtime_credential_values(tool)
+
+    # Callers may mutate the result, so always hand back a fresh dict.
     return {
-        'aws_access_key_id': aws_access_key_id,
-        'aws_secret_access_key': aws_secret_access_key,
-        'aws_region': aws_region,
+        'aws_access_key_id': tool_parameters.get('aws_access_key_id') or runtime_access_key_id,
+        'aws_secret_access_key': tool_parameters.get('aws_secret_access_key') or runtime_secret_access_key,
+        'aws_region': tool_parameters.get('aws_region') or runtime_region or 'us-east-1',
     }
 
 
 def build_boto3_client_kwargs(credentials: Dict[str, Optional[str]]) -> Dict[str, Any]:
-    """Construct boto3 client kwargs from merged credentials."""
-    kwargs: Dict[str, Any] = {}
+    """Construct boto3 client kwargs from merged credentials and the shared client config."""
+    kwargs: Dict[str, Any] = {'config': DEFAULT_CLIENT_CONFIG}
     if credentials.get('aws_region'):
         kwargs['region_name'] = credentials['aws_region']
     if credentials.get('aws_access_key_id') and credentials.get('aws_secret_access_key'):
@@ -144,3 +315,155 @@ def reset_clients_on_credential_change(
             if hasattr(owner, attr):
                 setattr(owner, attr, None)
         setattr(owner, signature_attr, signature)
+
+
+_CLIENT_CREATION_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=32)
+def _get_cached_session(signature: CredentialSignature) -> boto3.session.Session:
+    """Return a boto3 Session shared by every client built for the same credentials."""
+    aws_access_key_id, aws_secret_access_key, aws_region = signature
+    session_kwargs: Dict[str, Any] = {}
+    if aws_region:
+        session_kwargs['region_name'] = aws_region
+    if aws_access_key_id and aws_secret_access_key:
+        session_kwargs['aws_access_key_id'] = aws_access_key_id
+        session_kwargs['aws_secret_access_key'] = aws_secret_access_key
+    return boto3.session.Session(**session_kwargs)
+
+
+@lru_cache(maxsize=32)
+def _get_cached_client(service_name: str, signature: CredentialSignature) -> Any:
+    session = _get_cached_session(signature)
+    # boto3 Session is not thread-safe while creating clients; the clients themselves are.
+    with _CLIENT_CREATION_LOCK:
+        return session.client(service_name, config=DEFAULT_CLIENT_CONFIG)
+
+
+# boto3 clients held by the AgentCore SDK MemoryClient (attribute name, service name)
+_MEMORY_CLIENT_SERVICES = (
+    ('gmcp_client', 'bedrock-agentcore-control'),
+    ('gmdp_client', 'bedrock-agentcore'),
+)
+
+
+@lru_cache(maxsize=32)
+def _get_cached_memory_client(memory_client_cls: Any, signature: CredentialSignature) -> Any:
+    aws_access_key_id, aws_secret_access_key, aws_region = signature
+    if 'boto3_session' in inspect.signature(memory_client_cls).parameters:
+        # Newer SDKs build their clients from the shared Session inside the constructor.
+        with _CLIENT_CREATION_LOCK:
+            return memory_client_cls(region_name=aws_region, boto3_session=_get_cached_session(signature))
+
+    memory_client = memory_client_cls(region_name=aws_region)
+    if aws_access_key_id and aws_secret_access_key:
+        # Older SDKs use the default credential chain; swap in the cached clients for explicit AK/SK.
+        for client_attr, service_name in _MEMORY_CLIENT_SERVICES:
+            if getattr(memory_client, client_attr, None) is not None:
+                setattr(memory_client, client_attr, _get_cached_client(service_name, signature))
+    return memory_client
+
+
+def get_cached_session(credentials: Dict[str, Optional[str]]) -> boto3.session.Session:
+    """Return the shared boto3 Session for the given credentials without touching os.environ."""
+    return _get_cached_session(build_credential_signature(credentials))
+
+
+def get_cached_client(service_name: str, credentials: Dict[str, Optional[str]]) -> Any:
+    """Return a process-wide boto3 client keyed by service and credential signature.
+
+    Reusing the client keeps its HTTP connection pool, endpoint resolution and signer
+    across tool invocations instead of rebuilding them on every call.
+    """
+    return _get_cached_client(service_name, build_credential_signature(credentials))
+
+
+def get_cached_memory_client(memory_client_cls: Any, credentials: Dict[str, Optional[str]]) -> Any:
+    """Return a process-wide AgentCore MemoryClient for the credentials without touching os.environ.
+
+    The SDK class is passed in because bedrock-agentcore is an optional dependency of the tools.
+    """
+    return _get_cached_memory_client(memory_client_cls, build_credential_signature(credentials))
+
+
+def ensure_client(
+    owner: Any,
+    tool_parameters: Dict[str, Any],
+    service_name: str,
+    client_attr: str,
+) -> Tuple[Any, Dict[str, Optional[str]]]:
+    """Resolve credentials, drop a stale client and return (client, credentials) for owner.client_attr.
+
+    The client comes from get_cached_client, so a fresh tool instance still reuses the
+    process-wide client built for the same credentials.
+    """
+    credentials = resolve_aws_credentials(owner, tool_parameters)
+    reset_clients_on_credential_change(owner, credentials, [client_attr])
+    client = getattr(owner, client_attr, None)
+    if client is None:
+        client = get_cached_client(service_name, credentials)
+        setattr(owner, client_attr, client)
+    return client, credentials
+
+
+def ensure_clients(
+    owner: Any,
+    tool_parameters: Dict[str, Any],
+    client_map: Dict[str, str],
+) -> Dict[str, Optional[str]]:
+    """Like ensure_client, but fill several owner attributes (attr -> service name) in one call.
+
+    Returns the resolved credentials.
+    """
+    credentials = resolve_aws_credentials(owner, tool_parameters)
+    reset_clients_on_credential_change(owner, credentials, client_map)
+    for client_attr, service_name in client_map.items():
+        if getattr(owner, client_attr, None) is None:
+            setattr(owner, client_attr, get_cached_client(service_name, credentials))
+    return credentials
+
+
+# Surrounding whitespace plus one matching pair of quotes; a lone leading quote is kept.
+_QUOTED_ID_PATTERN = re.compile(
+    r"\s*(?:(?P<quote>[\"'])(?:(?P<quoted>.*)(?P=quote))?|(?P<bare>.*?))\s*",
+    flags=re.DOTALL,
+)
+
+
+def clean_id_parameter(value: Any) -> Any:
+    """Strip whitespace and one pair of matching quotes from an ID pasted into a tool parameter.
+
+    Non-string values are returned unchanged.
+    """
+    if not isinstance(value, str):
+        return value
+    match = _QUOTED_ID_PATTERN.fullmatch(value)
+    if match.group('quote') is None:
+        return match.group('bare')
+    return match.group('quoted') or ''
+
+
+def serialize_datetimes(mapping: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a shallow copy of an API response dict with datetime values as ISO 8601 strings.
+
+    botocore returns timestamps as datetime, so an exact type check is enough (no hasattr probing).
+    """
+    return {key: value.isoformat() if type(value) is datetime else value for key, value in mapping.items()}
+
+
+def dumps_json_bytes(value: Any) -> bytes:
+    """Serialize value to compact UTF-8 JSON bytes, using orjson when it is installed.
+
+    Raises TypeError for values that are not JSON serializable.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads_json(data: Union[bytes, str]) -> Any:
+    """Parse JSON from bytes or str without an intermediate decode; raises ValueError on bad input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
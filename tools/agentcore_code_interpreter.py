@@ -8,12 +8,25 @@ from collections.abc import Generator
 from typing import Any
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-import boto3
 import json
-import time
-from provider.utils import resolve_aws_credentials
+import threading
+from botocore.exceptions import BotoCoreError, ClientError
+from provider.utils import (
+    build_credential_signature,
+    get_cached_client,
+    resolve_aws_credentials,
+    reset_clients_on_credential_change,
+)
+
+# 自動生成した Code Interpreter を資格情報 (AK/SK/リージョン) ごとに覚えておき、
+# code_interpreter_id 未指定の呼び出しで毎回新規作成しないようにする。
+_AUTO_CREATED_INTERPRETERS: dict[tuple, str] = {}
+_AUTO_CREATED_INTERPRETERS_LOCK = threading.Lock()
 
 class AgentcoreCodeInterpreterTool(Tool):
+    _data_client: Any = None
+    _control_client: Any = None
+
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         credentials = resolve_aws_credentials(self, tool_parameters)
         merged_params = dict(tool_parameters)
@@ -21,6 +34,15 @@ class AgentcoreCodeInterpreterTool(Tool):
         merged_params.setdefault("aws_secret_access_key", credentials.get("aws_secret_access_key"))
         merged_params.setdefault("aws_region", credentials.get("aws_region"))
 
+        # 資格情報が変わらない限り、データプレーン/コントロールプレーンのクライアントを使い回す
+        reset_clients_on_credential_change(self, credentials, ("_data_client", "_control_client"))
+        if not self._data_client:
+            self._data_client = get_cached_client("bedrock-agentcore", credentials)
+        if not self._control_client and not tool_parameters.get("code_interpreter_id"):
+            self._control_client = get_cached_client("bedrock-agentcore-control", credentials)
+        merged_params["data_client"] = self._data_client
+        merged_params["control_client"] = self._control_client
+
         result = self.execute(**merged_params)
         yield self.create_json_message(result)
 
@@ -35,51 +57,64 @@ class AgentcoreCodeInterpreterTool(Tool):
         aws_access_key_id=None,
         aws_secret_access_key=None,
         aws_region=None,
+        data_client=None,
+        control_client=None,
         **kwargs,
     ):
-        error_msg = ""
-        
         try:
-            # 1. AWS 資格情報に応じたクライアントを生成
-            data_client = self.create_client(aws_access_key_id, aws_secret_access_key, aws_region, 'bedrock-agentcore')
-            
-            # 2. Code Interpreter が無ければ作成
-            if not code_interpreter_id:
-                control_client = self.create_client(aws_access_key_id, aws_secret_access_key, aws_region, 'bedrock-agentcore-control')
-                code_interpreter_id = self.create_code_interpreter(control_client)
+            # 0. AWS を呼ぶ前に入力を検証し、無駄なリソース作成を避ける
+            if not command and not code:
+                raise ValueError("Either command or code must be provided")
+
+            # 1. AWS 資格情報に応じたクライアントを用意 (_invoke から渡されていればそれを使う)
+            if data_client is None:
+                data_client = self.create_client(aws_access_key_id, aws_secret_access_key, aws_region, 'bedrock-agentcore')
             
+            # 2. Code Interpreter が無ければ作成 (同じ資格情報で作成済みなら再利用)
+            auto_created = not code_interpreter_id
+            if auto_created:
+                if control_client is None:
+                    control_client = self.create_client(aws_access_key_id, aws_secret_access_key, aws_region, 'bedrock-agentcore-control')
+                credential_signature = build_credential_signature({
+                    'aws_access_key_id': aws_access_key_id,
+                    'aws_secret_access_key': aws_secret_access_key,
+                    'aws_region': aws_region,
+                })
+                code_interpreter_id = self.ensure_interpreter(control_client, credential_signature)
+
             # 3. セッションを新規作成する
-            if not session_id:
-                session_id = self.init_session(data_client, code_interpreter_id)
-            
+            if auto_created and not session_id:
+                try:
+                    session_id = self.init_session(data_client, code_interpreter_id)
+                except ClientError as e:
+                    if e.response.get("Error", {}).get("Code") != "ResourceNotFoundException":
+                        raise
+                    # 記録済みの Code Interpreter が削除されていれば記録を捨て、一度だけ作り直す
+                    self.evict_interpreter(credential_signature, code_interpreter_id)
+                    code_interpreter_id = self.ensure_interpreter(control_client, credential_signature)
+                    session_id = self.init_session(data_client, code_interpreter_id)
+            else:
+                session_id = self.ensure_session(data_client, code_interpreter_id, session_id)
+
             # 4. コマンド→コードの順番で実行
             results = []
-            
+
             if command:
                 command_result = self.exec_command_internal(data_client, code_interpreter_id, session_id, command)
                 results.append({"type": "command", "result": command_result})
-            
+
             if code and language:
                 code_result = self.exec_code_internal(data_client, code_interpreter_id, session_id, language, code)
                 results.append({"type": "code", "result": code_result})
-            
-            if not command and not code:
-                raise ValueError("Either command or code must be provided")
-                
-        except Exception as e:
-            error_msg = str(e)
-        
-        if error_msg:
-            result = {"status": "error", "reason": str(error_msg)}
-        else:
-            result = {
-                "status": "success", 
-                "session_id": session_id, 
+
+            return {
+                "status": "success",
+                "session_id": session_id,
                 "code_interpreter_id": code_interpreter_id,
                 "results": results
             }
-        
-        return result
+        except (ClientError, BotoCoreError, ValueError, KeyError) as e:
+            return {"status": "error", "reason": str(e)}
 
     def create_client(
         self,
@@ -88,17 +123,42 @@ class AgentcoreCodeInterpreterTool(Tool):
         aws_region: str | None = None,
         service_name: str = 'bedrock-agentcore',
     ):
-        """必要に応じて認証情報を付与した boto3 クライアントを作る."""
-        kwargs: dict[str, Any] = {}
-        if aws_region:
-            kwargs['region_name'] = aws_region
-        if aws_access_key_id and aws_secret_access_key:
-            kwargs['aws_access_key_id'] = aws_access_key_id
-            kwargs['aws_secret_access_key'] = aws_secret_access_key
-        return boto3.client(service_name, **kwargs)
+        """必要に応じて認証情報を付与した boto3 クライアントを取得する (同一資格情報ではキャッシュを再利用)."""
+        return get_cached_client(service_name, {
+            'aws_access_key_id': aws_access_key_id,
+            'aws_secret_access_key': aws_secret_access_key,
+            'aws_region': aws_region,
+        })
+
+    def ensure_interpreter(self, control_client, credential_signature) -> str:
+        """資格情報ごとに自動生成済みの Code Interpreter を返し、無ければ作成する."""
+        code_interpreter_id = _AUTO_CREATED_INTERPRETERS.get(credential_signature)
+        if code_interpreter_id:
+            return code_interpreter_id
+        with _AUTO_CREATED_INTERPRETERS_LOCK:
+            code_interpreter_id = _AUTO_CREATED_INTERPRETERS.get(credential_signature)
+            if not code_interpreter_id:
+                code_interpreter_id = self.create_code_interpreter(control_client)
+                if code_interpreter_id:
+                    _AUTO_CREATED_INTERPRETERS[credential_signature] = code_interpreter_id
+        return code_interpreter_id
+
+    def evict_interpreter(self, credential_signature, code_interpreter_id) -> None:
+        """自動生成済みとして記録した Code Interpreter が指定 ID のままなら記録を削除する."""
+        with _AUTO_CREATED_INTERPRETERS_LOCK:
+            if _AUTO_CREATED_INTERPRETERS.get(credential_signature) == code_interpreter_id:
+                del _AUTO_CREATED_INTERPRETERS[credential_signature]
+
+    def ensure_session(self, data_client, code_interpreter_id, session_id=None) -> str:
+        """指定セッションがあればそれを、無ければ新しいセッションを返す."""
+        if session_id:
+            return session_id
+        return self.init_session(data_client, code_interpreter_id)
 
     def create_code_interpreter(self, client):
         """新しい Code Interpreter を生成する."""
+        import time
+
         timestamp = int(time.time())
         response = client.create_code_interpreter(
             name=f'code_interpreter_{timestamp}',
@@ -145,12 +205,20 @@ class AgentcoreCodeInterpreterTool(Tool):
 
 
     def get_tool_result(self, response):
+        """最初の result イベントだけを取り出し、残りのストリームはすぐに閉じる."""
         try:
             if "stream" in response:
                 event_stream = response["stream"]
-                for event in event_stream:
-                    if "result" in event:
-                        result = event["result"]
-                        return str(result)
+                try:
+                    for event in event_stream:
+                        if "result" in event:
+                            result = event["result"]
+                            if isinstance(result, (dict, list)):
+                                return json.dumps(result, ensure_ascii=False, separators=(',', ':'))
+                            return str(result)
+                finally:
+                    close = getattr(event_stream, "close", None)
+                    if close is not None:
+                        close()
         except Exception as e:
             return f"tool result error: {e}"
@@ -9,22 +9,29 @@ import logging
 import os
 import sys
 from collections.abc import Generator
+from functools import lru_cache
 from typing import Any, Dict, Optional
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-from provider.utils import resolve_aws_credentials
+from provider.utils import clean_id_parameter, get_cached_memory_client, resolve_aws_credentials
 
-# AgentCore SDK は追加依存のため、同梱されていない場合も考慮する
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-try:
-    from bedrock_agentcore.memory import MemoryClient
 
-    AGENTCORE_SDK_AVAILABLE = True
-except ImportError as exc:  # pragma: no cover - SDK 未導入環境に備える
-    MemoryClient = None
-    AGENTCORE_SDK_AVAILABLE = False
-    print(f"Warning: bedrock-agentcore SDK import failed: {exc}")
+
+@lru_cache(maxsize=1)
+def _get_memory_client_cls() -> Any:
+    """AgentCore SDK の MemoryClient を初回利用時にだけ import する.
+
+    SDK は追加依存のため、同梱されていない場合は None を返す。
+    """
+    try:
+        from bedrock_agentcore.memory import MemoryClient
+    except ImportError as exc:  # pragma: no cover - SDK 未導入環境に備える
+        print(f"Warning: bedrock-agentcore SDK import failed: {exc}")
+        return None
+    return MemoryClient
+
 
 logger = logging.getLogger(__name__)
 
@@ -40,36 +47,16 @@ class AgentCoreMemoryTool(Tool):
     # ------------------------------------------------------------------
     # 初期化や ID 生成まわり
     # ------------------------------------------------------------------
-    def _clean_id_parameter(self, value: str) -> str:
-        """引用符などを除去して素の ID 文字列を返す."""
-        if value and isinstance(value, str):
-            trimmed = value.strip()
-            if (trimmed.startswith("\"") and trimmed.endswith("\"")) or (
-                trimmed.startswith("'") and trimmed.endswith("'")
-            ):
-                trimmed = trimmed[1:-1]
-            return trimmed
-        return value
-
     def _initialize_memory_client(self, tool_parameters: dict[str, Any]) -> bool:
         """AWS 資格情報から MemoryClient を構築する."""
-        if not AGENTCORE_SDK_AVAILABLE:
+        if _get_memory_client_cls() is None:
             logger.error("AgentCore Memory SDK not available")
             return False
 
         try:
             credentials = resolve_aws_credentials(self, tool_parameters)
-            aws_region = credentials.get("aws_region") or "us-east-1"
-            aws_access_key_id = credentials.get("aws_access_key_id")
-            aws_secret_access_key = credentials.get("aws_secret_access_key")
-
-            # 明示的な AK/SK が渡された場合は環境変数経由で設定
-            if aws_access_key_id and aws_secret_access_key:
-                os.environ["AWS_ACCESS_KEY_ID"] = aws_access_key_id
-                os.environ["AWS_SECRET_ACCESS_KEY"] = aws_secret_access_key
-                os.environ["AWS_REGION"] = aws_region
-
-            self.memory_client = MemoryClient(region_name=aws_region)
+            credentials["aws_region"] = credentials.get("aws_region") or "us-east-1"
+            self.memory_client = get_cached_memory_client(_get_memory_client_cls(), credentials)
             logger.info("AgentCore Memory client initialized")
             return True
         except Exception as exc:  # pragma: no cover - SDK 例外
@@ -211,9 +198,9 @@ class AgentCoreMemoryTool(Tool):
             return
 
         # 既存 ID が渡されていれば利用、無ければ新規作成
-        memory_id = self._clean_id_parameter(tool_parameters.get("memory_id", ""))
-        actor_id = self._clean_id_parameter(tool_parameters.get("actor_id", ""))
-        session_id = self._clean_id_parameter(tool_parameters.get("session_id", ""))
+        memory_id = clean_id_parameter(tool_parameters.get("memory_id", ""))
+        actor_id = clean_id_parameter(tool_parameters.get("actor_id", ""))
+        session_id = clean_id_parameter(tool_parameters.get("session_id", ""))
 
         if not (memory_id and actor_id and session_id):
             try:
@@ -4,16 +4,17 @@
 目的: AgentCore Memory に蓄積した会話やナレッジを Workflow から検索可能にする。
 """
 
-import json
 import logging
+import os
+import sys
+from datetime import date, time
 from collections.abc import Generator
+from itertools import islice
 from typing import Any, Dict
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-from provider.utils import resolve_aws_credentials
+from provider.utils import TTLCache, build_credential_signature, clean_id_parameter, get_cached_memory_client, resolve_aws_credentials
 
-import sys
-import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
@@ -26,44 +27,31 @@ except ImportError as exc:  # pragma: no cover
 
 logger = logging.getLogger(__name__)
 
+# isoformat() で文字列化する日時型 (datetime は date のサブクラス)
+_ISO_FORMAT_TYPES = (date, time)
+
+# 同じ検索条件の結果を短時間保持し、繰り返し実行されるワークフローでは API 呼び出しを省く
+_SEARCH_RESULT_CACHE = TTLCache(maxsize=256, ttl=60)
+
 
 class AgentCoreMemorySearchTool(Tool):
     memory_client: Any = None
-    
-    def _clean_id_parameter(self, value: str) -> str:
-        """ID 文字列の前後にある引用符を取り除く."""
-        if value and isinstance(value, str):
-            # Remove surrounding quotes if present
-            value = value.strip()
-            if (value.startswith('"') and value.endswith('"')) or (value.startswith("'") and value.endswith("'")):
-                value = value[1:-1]
-        return value
+    _credential_signature: Any = None
     
     def _initialize_memory_client(self, tool_parameters: dict[str, Any]) -> bool:
         """AWS 資格情報を元に MemoryClient を初期化する."""
         try:
             credentials = resolve_aws_credentials(self, tool_parameters)
             aws_region = credentials.get("aws_region") or 'us-east-1'
-            aws_access_key_id = credentials.get("aws_access_key_id")
-            aws_secret_access_key = credentials.get("aws_secret_access_key")
-
-            if AGENTCORE_SDK_AVAILABLE:
-                # AK/SK が両方ある場合は環境変数経由で渡す
-                if aws_access_key_id and aws_secret_access_key:
-                    # For MemoryClient, we need to set environment variables or use boto3 session
-                    import os
-                    os.environ['AWS_ACCESS_KEY_ID'] = aws_access_key_id
-                    os.environ['AWS_SECRET_ACCESS_KEY'] = aws_secret_access_key
-                    os.environ['AWS_REGION'] = aws_region
-                
-                # MemoryClient を生成
-                self.memory_client = MemoryClient(region_name=aws_region)
-                logger.info(f"Memory client initialized for region: {aws_region}")
-                return True
-            else:
-                logger.error("AgentCore Memory SDK not available")
-                return False
-                
+            credentials["aws_region"] = aws_region
+
+            # 環境変数を書き換えず、資格情報付き Session を渡した MemoryClient を共有する
+            # (SDK の有無は _invoke の入口で確認済み)
+            self.memory_client = get_cached_memory_client(MemoryClient, credentials)
+            self._credential_signature = build_credential_signature(credentials)
+            logger.info(f"Memory client initialized for region: {aws_region}")
+            return True
+
         except Exception as e:
             logger.error(f"Failed to initialize Memory client: {str(e)}")
             return False
@@ -74,7 +62,7 @@ class AgentCoreMemorySearchTool(Tool):
             # 業務パラメータを取り出す
             search_query = tool_parameters.get('search_query', 'all')
             max_results = tool_parameters.get('max_results', 10)
-            memory_id = self._clean_id_parameter(tool_parameters.get('memory_id', ''))
+            memory_id = clean_id_parameter(tool_parameters.get('memory_id', ''))
             namespace = tool_parameters.get('namespace', '/')
             
             # クエリ未指定なら all を利用
@@ -93,43 +81,45 @@ class AgentCoreMemorySearchTool(Tool):
             if max_results < 1 or max_results > 20:
                 max_results = 10
             
-            yield self.create_text_message(f"🔍 Searching memories for: '{search_query}' in namespace: '{namespace}'")
-            
             if self.memory_client:
-                # retrieve_memories API を呼び出し
-                result = self.memory_client.retrieve_memories(
-                    memory_id=memory_id,
-                    query=search_query,
-                    namespace=namespace,
-                    top_k=max_results
-                )
-                
-                # レスポンスからメモリー配列を取得
-                memories_list = result.get('memories', []) if isinstance(result, dict) else result
-                
-                # イテラブルでなければリスト化
-                if not isinstance(memories_list, list):
-                    memories_list = list(memories_list) if hasattr(memories_list, '__iter__') else []
-                
-                # 取得数を max_results で制限
-                if max_results and len(memories_list) > max_results:
-                    memories_list = memories_list[:max_results]
-                
-                # JSON シリアライズしやすい形へ変換
-                processed_memories = []
-                for memory in memories_list:
-                    if isinstance(memory, dict):
-                        # datetime なら ISO8601 文字列へ
-                        processed_memory = {}
-                        for key, value in memory.items():
-                            if hasattr(value, 'isoformat'):  # datetime object
-                                processed_memory[key] = value.isoformat()
-                            else:
-                                processed_memory[key] = value
-                        processed_memories.append(processed_memory)
+                # 同一条件の検索結果がキャッシュにあれば API を呼ばない
+                cache_key = (self._credential_signature, memory_id, namespace, search_query.strip(), max_results)
+                processed_memories = None
+                if not tool_parameters.get('force_refresh'):
+                    processed_memories = _SEARCH_RESULT_CACHE.get(cache_key)
+
+                if processed_memories is None:
+                    # retrieve_memories API を呼び出し
+                    result = self.memory_client.retrieve_memories(
+                        memory_id=memory_id,
+                        query=search_query,
+                        namespace=namespace,
+                        top_k=max_results,
+                    )
+                    
+                    # レスポンスからメモリー配列を取得
+                    memories_list = result.get('memories', []) if isinstance(result, dict) else result
+                    
+                    # 先頭から max_results 件だけを取り出す (ジェネレーターでも全件は展開しない)
+                    if hasattr(memories_list, '__iter__'):
+                        memories_list = list(islice(memories_list, max_results))
                     else:
-                        processed_memories.append(str(memory))
-                
+                        memories_list = []
+                    
+                    # JSON シリアライズしやすい形へ変換
+                    processed_memories = [None] * len(memories_list)
+                    for index, memory in enumerate(memories_list):
+                        if isinstance(memory, dict):
+                            # 日時型なら ISO8601 文字列へ
+                            processed_memories[index] = {
+                                key: value.isoformat() if isinstance(value, _ISO_FORMAT_TYPES) else value
+                                for key, value in memory.items()
+                            }
+                        else:
+                            processed_memories[index] = str(memory)
+                    
+                    _SEARCH_RESULT_CACHE.set(cache_key, processed_memories)
+
                 # 詳細を付けた JSON レスポンスを組み立て
                 response_data = {
                     'success': True,
@@ -154,6 +144,12 @@ class AgentCoreMemorySearchTool(Tool):
 
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         """検索専用ツールとして初期化と検索処理を実行する."""
+        # SDK の有無は import 時に決まるため、クライアント初期化より前に一度だけ判定する
+        if not AGENTCORE_SDK_AVAILABLE:
+            logger.error("AgentCore Memory SDK not available")
+            yield self.create_text_message("❌ AgentCore Memory SDK not available")
+            return
+
         try:
             # Initialize Memory client if not already initialized
             if not self.memory_client:
@@ -8,19 +8,32 @@ import json
 import logging
 from typing import Any, Union, Optional
 from collections.abc import Generator
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from botocore.exceptions import BotoCoreError  # type: ignore
-import boto3  # type: ignore
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-from provider.utils import resolve_aws_credentials, build_boto3_client_kwargs
+from provider.utils import get_cached_client, resolve_aws_credentials
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - orjson は任意依存
+    orjson = None
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def _dump_response_for_debug(response: Any) -> str:
+    """デバッグ出力用にレスポンスを整形済み JSON 文字列へ変換する (orjson があれば優先)."""
+    if orjson is not None:
+        return orjson.dumps(response, option=orjson.OPT_INDENT_2, default=str).decode()
+    return json.dumps(response, indent=2, default=str)
+
 class GuardrailParameters(BaseModel):
+    # 検証後の値は読み取り専用にする (text は前後の空白も含めてそのまま Guardrail へ渡す)
+    model_config = ConfigDict(frozen=True)
+
     guardrail_id: str = Field(..., description="The identifier of the guardrail")
     guardrail_version: str = Field(..., description="The version of the guardrail")
     source: str = Field(..., description="The source of the content")
@@ -38,12 +51,11 @@ class ApplyGuardrailTool(Tool):
             params = GuardrailParameters(**tool_parameters)
 
             credentials = resolve_aws_credentials(self, tool_parameters)
-            client_kwargs = build_boto3_client_kwargs(credentials)
             if params.aws_region:
-                client_kwargs["region_name"] = params.aws_region
+                credentials["aws_region"] = params.aws_region
 
-            # 👉 ガードレール適用は bedrock-runtime クライアントを使う
-            bedrock_client = boto3.client("bedrock-runtime", **client_kwargs)
+            # 👉 ガードレール適用は bedrock-runtime クライアントを使う (接続プールを広げた共有クライアント)
+            bedrock_client = get_cached_client("bedrock-runtime", credentials)
 
             # 👉 Guardrail API を実行
             response = bedrock_client.apply_guardrail(
@@ -53,7 +65,9 @@ class ApplyGuardrailTool(Tool):
                 content=[{"text": {"text": params.text}}],
             )
 
-            logger.info(f"Raw response from AWS: {json.dumps(response, indent=2)}")
+            # 👉 レスポンス全体の JSON 化は DEBUG 出力時だけ行う
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Raw response from AWS: %s", _dump_response_for_debug(response))
 
             # 👉 応答が空ならユーザーに知らせる
             if not response:
@@ -66,17 +80,19 @@ class ApplyGuardrailTool(Tool):
             assessments = response.get("assessments", [])
 
             # 👉 ポリシー別の評価内容を単純な文字列へ展開
-            formatted_assessments = []
+            formatted_assessments: list[str] = []
+            append = formatted_assessments.append
             for assessment in assessments:
                 for policy_type, policy_data in assessment.items():
-                    if isinstance(policy_data, dict) and "topics" in policy_data:
-                        for topic in policy_data["topics"]:
-                            formatted_assessments.append(
-                                f"Policy: {policy_type}, Topic: {topic['name']}, Type: {topic['type']},"
-                                f" Action: {topic['action']}"
-                            )
-                    else:
-                        formatted_assessments.append(f"Policy: {policy_type}, Data: {policy_data}")
+                    topics = policy_data.get("topics") if isinstance(policy_data, dict) else None
+                    if topics is None:
+                        append(f"Policy: {policy_type}, Data: {policy_data}")
+                        continue
+                    for topic in topics:
+                        append(
+                            f"Policy: {policy_type}, Topic: {topic['name']}, Type: {topic['type']},"
+                            f" Action: {topic['action']}"
+                        )
 
             result = f"Action: {action}\n "
             result += f"Output: {output}\n "
@@ -9,7 +9,6 @@ from __future__ import annotations
 from collections.abc import Generator
 from typing import Any
 
-import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 
 from dify_plugin import Tool
@@ -17,17 +16,26 @@ from dify_plugin.entities.tool import ToolInvokeMessage
 
 try:
     from my_aws_tools.provider.utils import (
-        build_boto3_client_kwargs,
+        TTLCache,
+        build_credential_signature,
+        get_cached_client,
         resolve_aws_credentials,
         reset_clients_on_credential_change,
+        serialize_datetimes,
     )
 except ModuleNotFoundError:  # pragma: no cover
     from provider.utils import (
-        build_boto3_client_kwargs,
+        TTLCache,
+        build_credential_signature,
+        get_cached_client,
         resolve_aws_credentials,
         reset_clients_on_credential_change,
+        serialize_datetimes,
     )
 
+# 直近に取得した一覧を資格情報 + リクエスト内容ごとに短時間保持する
+_RESPONSE_CACHE = TTLCache(maxsize=256, ttl=60)
+
 
 class BedrockKBListTool(Tool):
     bedrock_client: Any | None = None
@@ -35,18 +43,35 @@ class BedrockKBListTool(Tool):
     def _ensure_client(self, credentials: dict[str, Any]) -> None:
         reset_clients_on_credential_change(self, credentials, ["bedrock_client"])
         if not self.bedrock_client:
-            client_kwargs = build_boto3_client_kwargs(credentials)
-            self.bedrock_client = boto3.client("bedrock-agent", **client_kwargs)
-
-    @staticmethod
-    def _serialize_summary(summary: dict[str, Any]) -> dict[str, Any]:
-        serialized: dict[str, Any] = {}
-        for key, value in summary.items():
-            if hasattr(value, "isoformat"):
-                serialized[key] = value.isoformat()
-            else:
-                serialized[key] = value
-        return serialized
+            self.bedrock_client = get_cached_client("bedrock-agent", credentials)
+
+    def _iter_pages(
+        self,
+        request_kwargs: dict[str, Any],
+        *,
+        signature: Any,
+        fetch_all: bool,
+        force_refresh: bool,
+    ) -> Generator[tuple[list[dict[str, Any]], str | None], None, None]:
+        """(シリアライズ済みサマリー, nextToken) をページ単位で遅延的に返す.
+
+        fetch_all が False なら 1 ページだけ取得する。各ページは資格情報 + リクエスト内容をキーにキャッシュする。
+        """
+        request_kwargs = dict(request_kwargs)
+        while True:
+            cache_key = (signature, tuple(sorted(request_kwargs.items())))
+            response = None if force_refresh else _RESPONSE_CACHE.get(cache_key)
+            if response is None:
+                response = self.bedrock_client.list_knowledge_bases(**request_kwargs)
+                _RESPONSE_CACHE.set(cache_key, response)
+
+            summaries = response.get("knowledgeBaseSummaries", []) or []
+            page_next_token = response.get("nextToken")
+            yield [serialize_datetimes(summary) for summary in summaries], page_next_token
+
+            if not (fetch_all and page_next_token):
+                return
+            request_kwargs["nextToken"] = page_next_token
 
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
         try:
@@ -71,37 +96,36 @@ class BedrockKBListTool(Tool):
         if next_token:
             request_kwargs["nextToken"] = next_token
 
+        pages = self._iter_pages(
+            request_kwargs,
+            signature=build_credential_signature(credentials),
+            fetch_all=bool(tool_parameters.get("fetch_all_pages")) and not next_token,
+            force_refresh=bool(tool_parameters.get("force_refresh")),
+        )
+
+        # ページを取得するたびにメッセージを返し、後続処理を先に始められるようにする
+        emitted_any = False
         try:
-            response = self.bedrock_client.list_knowledge_bases(**request_kwargs)
+            for serialized, page_next_token in pages:
+                result_payload = {
+                    "knowledge_bases": serialized,
+                    "next_token": page_next_token,
+                }
+
+                yield self.create_json_message(result_payload)
+
+                if serialized:
+                    emitted_any = True
+                    # ID / name / status はいずれも文字列か None なので、None だけ空文字に置き換える
+                    text = "\n".join(
+                        f"{summary.get('knowledgeBaseId') or ''},{summary.get('name') or ''},{summary.get('status') or ''}"
+                        for summary in serialized
+                    )
+                    yield self.create_text_message(text)
         except (BotoCoreError, ClientError) as exc:
             message = getattr(exc, "response", {}).get("Error", {}).get("Message", str(exc))
             yield self.create_text_message(f"Failed to list knowledge bases: {message}")
             return
 
-        summaries = response.get("knowledgeBaseSummaries", []) or []
-        serialized_summaries = [self._serialize_summary(summary) for summary in summaries]
-        result_payload = {
-            "knowledge_bases": serialized_summaries,
-            "next_token": response.get("nextToken"),
-        }
-
-        yield self.create_json_message(result_payload)
-
-        if serialized_summaries:
-            def _get_field(summary: dict[str, Any], key: str) -> str:
-                value = summary.get(key, "")
-                return str(value) if value is not None else ""
-
-            text_lines = [
-                ",".join(
-                    [
-                        _get_field(summary, "knowledgeBaseId"),
-                        _get_field(summary, "name"),
-                        _get_field(summary, "status"),
-                    ]
-                )
-                for summary in serialized_summaries
-            ]
-            yield self.create_text_message("\n".join(text_lines))
-        else:
+        if not emitted_any:
             yield self.create_text_message("No knowledge bases found")
@@ -10,7 +10,6 @@ import json
 from collections.abc import Generator
 from typing import Any
 
-import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 
 from dify_plugin import Tool
@@ -18,15 +17,17 @@ from dify_plugin.entities.tool import ToolInvokeMessage
 
 try:
     from my_aws_tools.provider.utils import (
-        build_boto3_client_kwargs,
+        get_cached_client,
         resolve_aws_credentials,
         reset_clients_on_credential_change,
+        serialize_datetimes,
     )
 except ModuleNotFoundError:  # pragma: no cover
     from provider.utils import (
-        build_boto3_client_kwargs,
+        get_cached_client,
         resolve_aws_credentials,
         reset_clients_on_credential_change,
+        serialize_datetimes,
     )
 
 
@@ -36,14 +37,7 @@ class BedrockKBStartIngestionJobTool(Tool):
     def _ensure_client(self, credentials: dict[str, Any]) -> None:
         reset_clients_on_credential_change(self, credentials, ["bedrock_client"])
         if not self.bedrock_client:
-            client_kwargs = build_boto3_client_kwargs(credentials)
-            self.bedrock_client = boto3.client("bedrock-agent", **client_kwargs)
-
-    @staticmethod
-    def _format_datetime(value: Any) -> Any:
-        if hasattr(value, "isoformat"):
-            return value.isoformat()
-        return value
+            self.bedrock_client = get_cached_client("bedrock-agent", credentials)
 
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
         try:
@@ -85,10 +79,7 @@ class BedrockKBStartIngestionJobTool(Tool):
             return
 
         ingestion_job: dict[str, Any] = response.get("ingestionJob", {}) or {}
-        serialized_job = {
-            key: self._format_datetime(value)
-            for key, value in ingestion_job.items()
-        }
+        serialized_job = serialize_datetimes(ingestion_job)
 
         result_payload = {
             "knowledge_base_id": knowledge_base_id,
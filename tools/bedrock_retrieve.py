@@ -4,71 +4,88 @@
 目的: Workflow / Agent から追加サーバー不要で Bedrock KB を直接参照できるようにする。
 """
 
-import json
 import operator
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Optional, Union
 from collections.abc import Generator
 
-import boto3
-
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from provider.utils import (
+    TTLCache,
+    build_credential_signature,
+    get_cached_client,
     resolve_aws_credentials,
-    build_boto3_client_kwargs,
     reset_clients_on_credential_change,
 )
 
+try:
+    import orjson as _json  # type: ignore
+except ImportError:  # pragma: no cover - orjson は任意依存
+    import json as _json
+
+# 複数クエリを同じクライアント (同じ接続プール) 上で並列に検索する際の同時実行数
+RETRIEVE_MAX_CONCURRENCY = 8
+_RETRIEVE_EXECUTOR = ThreadPoolExecutor(max_workers=RETRIEVE_MAX_CONCURRENCY, thread_name_prefix="bedrock-retrieve")
+
+# 同じ検索条件の結果を資格情報ごとに短時間保持し、ワークフロー内で繰り返される同一クエリの API 呼び出しを省く
+_RESULT_CACHE = TTLCache(maxsize=256, ttl=60)
+
+
 class BedrockRetrieveTool(Tool):
     bedrock_client: Any = None
     knowledge_base_id: str = None
     topk: int = None
+    # validate_parameters で解析した JSON 文字列 → 解析結果 (_invoke で同じ文字列を再解析しないため)
+    _parsed_json_parameters: Optional[dict] = None
+
+    def _load_json_parameter(self, raw: str) -> Any:
+        """JSON 文字列パラメータを dict へ展開する. validate_parameters で解析済みならその結果を使う."""
+        parsed_parameters = self._parsed_json_parameters or {}
+        if raw in parsed_parameters:
+            return parsed_parameters.pop(raw)
+        return _json.loads(raw)
 
     def convert_to_dify_kb_format(self, kb_repsonse):
         """Bedrock 検索結果を Dify Knowledge 互換の配列に再構築する補助メソッド."""
         result_array = []
         for idx, item in enumerate(kb_repsonse['retrievalResults']):
-            # 👉 Bedrock が付与したメタデータをそのまま移し替える
-            source_uri = item['metadata']['x-amz-bedrock-kb-source-uri']
-            page_number = item['metadata'].get('x-amz-bedrock-kb-document-page-number', 0)
-            data_source_id = item['metadata'].get('x-amz-bedrock-kb-data-source-id', '')
-            chunk_id = item['metadata'].get('x-amz-bedrock-kb-chunk-id','')
-            score = item.get('score', 0.0)
+            text = item['content']['text']
+            # 👉 本文が空のチャンクは除外する (position は元の順位のまま)
+            if not text.strip():
+                continue
 
+            # 👉 Bedrock が付与したメタデータをそのまま移し替える
+            item_metadata = item['metadata']
             # 👉 URI 末尾から簡易的にファイル名を作る
-            document_name = source_uri.split('/')[-1]
+            document_name = item_metadata['x-amz-bedrock-kb-source-uri'].split('/')[-1]
 
             # 👉 Dify 側の検索結果カードに合わせたキー構成を作る
             metadata = {
                 "_source": "knowledge",
-                "dataset_id": data_source_id,
+                "dataset_id": item_metadata.get('x-amz-bedrock-kb-data-source-id', ''),
                 "dataset_name": "BedRock knowledge base",
                 "document_id": document_name,
                 "document_name": document_name,
                 "document_data_source_type": item['content']['type'],
-                "segment_id": chunk_id,
+                "segment_id": item_metadata.get('x-amz-bedrock-kb-chunk-id', ''),
                 "retriever_from": "workflow",
-                "score": round(score, 6),
+                "score": round(item.get('score', 0.0), 6),
                 "segment_hit_count": 1,  # サンプルでは常に 1 件ヒットとして扱う
-                "segment_word_count": len(item['content']['text']),  # 文字数をそのまま語数の近似値として利用
-                "segment_position": page_number,
+                "segment_word_count": len(text),  # 文字数をそのまま語数の近似値として利用
+                "segment_position": item_metadata.get('x-amz-bedrock-kb-document-page-number', 0),
                 "doc_metadata": {
                     "tag": "bedrock knowledge base",
                     "source": item["location"]["type"],
                     "uploader": "advantage",
-                    "upload_date": int(1715299200),  # デモ用の固定タイムスタンプ
+                    "upload_date": 1715299200,  # デモ用の固定タイムスタンプ
                     "document_name": document_name,
-                    "last_update_date": int(1715299200)
+                    "last_update_date": 1715299200
                 },
                 "position": idx + 1
             }
 
-            if item['content']['text'].strip() != "" :
-                result_array.append({
-                    "content": item['content']['text'],
-                    "title": f"{document_name}",  # ここでタイトルを確定
-                    "metadata": metadata
-                })
+            result_array.append({"content": text, "title": document_name, "metadata": metadata})
 
         return result_array
 
@@ -128,66 +145,103 @@ class BedrockRetrieveTool(Tool):
     ) -> Generator[ToolInvokeMessage]:
         """Dify から渡されたパラメータを検証し、検索結果を JSON もしくはテキストで返すメインエントリ."""
         try:
-            line = 0  # 例外発生時にどの段階か把握するためのステップ番号
             credentials = resolve_aws_credentials(self, tool_parameters)
             reset_clients_on_credential_change(self, credentials, ["bedrock_client"])
 
             if not self.bedrock_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                client_kwargs["service_name"] = "bedrock-agent-runtime"
-                self.bedrock_client = boto3.client(**client_kwargs)
+                self.bedrock_client = get_cached_client("bedrock-agent-runtime", credentials)
         except Exception as e:
             yield self.create_text_message(f"Failed to initialize Bedrock client: {str(e)}")
+            return
 
         try:
-            line = 1  # Knowledge Base ID のキャッシュが無ければ読み出す
+            # Knowledge Base ID のキャッシュが無ければ読み出す
             if not self.knowledge_base_id:
                 self.knowledge_base_id = tool_parameters.get("knowledge_base_id")
                 if not self.knowledge_base_id:
                     yield self.create_text_message("Please provide knowledge_base_id")
+                    return
 
-            line = 2  # topk は順次リクエストで変えられるようキャッシュに初期値を保存
+            # topk は順次リクエストで変えられるようキャッシュに初期値を保存
             if not self.topk:
                 self.topk = tool_parameters.get("topk", 5)
 
-            line = 3  # クエリ未指定の場合は早期リターン
+            # クエリ未指定の場合は早期リターン (Bedrock へ確実に失敗するリクエストを送らない)
             query = tool_parameters.get("query", "")
             if not query:
                 yield self.create_text_message("Please input query")
+                return
 
             # 👉 metadata_filter は JSON 文字列で渡されるためここで dict へ展開
             metadata_filter_str = tool_parameters.get("metadata_filter")
-            metadata_filter = json.loads(metadata_filter_str) if metadata_filter_str else None
+            metadata_filter = self._load_json_parameter(metadata_filter_str) if metadata_filter_str else None
 
             search_type = tool_parameters.get("search_type")
             rerank_model_id = tool_parameters.get("rerank_model_id")
 
-            line = 4  # 検索本体の実行
-            retrieved_docs = self._bedrock_retrieve(
-                query_input=query,
-                knowledge_base_id=self.knowledge_base_id,
-                num_results=self.topk,
-                search_type=search_type,
-                rerank_model_id=rerank_model_id,
-                metadata_filter=metadata_filter,
-            )
+            # 👉 additional_queries は改行区切り。空行と重複を除き、メインのクエリを先頭にする
+            queries = list(dict.fromkeys(
+                q for q in [query, *(tool_parameters.get("additional_queries") or "").splitlines()] if q.strip()
+            ))
+            # 空白だけのクエリは除外されるため、ここで改めて空を判定する
+            if not queries:
+                yield self.create_text_message("Please input query")
+                return
+
+            signature = build_credential_signature(credentials)
+            force_refresh = bool(tool_parameters.get("force_refresh"))
+
+            # 検索本体の実行 (複数クエリは共有スレッドプールで並列に投げ、ネットワーク待ちを重ねる)
+            def retrieve(query_input: str) -> list:
+                cache_key = (
+                    signature,
+                    self.knowledge_base_id,
+                    query_input,
+                    self.topk,
+                    search_type,
+                    rerank_model_id,
+                    metadata_filter_str,
+                )
+                results = None if force_refresh else _RESULT_CACHE.get(cache_key)
+                if results is None:
+                    results = self._bedrock_retrieve(
+                        query_input=query_input,
+                        knowledge_base_id=self.knowledge_base_id,
+                        num_results=self.topk,
+                        search_type=search_type,
+                        rerank_model_id=rerank_model_id,
+                        metadata_filter=metadata_filter,
+                    )
+                    _RESULT_CACHE.set(cache_key, results)
+                return results
+
+            if len(queries) <= 1:
+                results_by_query = [(queries[0], retrieve(queries[0]))]
+            else:
+                results_by_query = list(zip(queries, _RETRIEVE_EXECUTOR.map(retrieve, queries)))
+            retrieved_docs = results_by_query[0][1]
 
-            line = 5  # 応答形式に応じた整形
+            # 応答形式に応じた整形
             result_type = tool_parameters.get("result_type")
             if result_type == "json":
                 json_result = { "results" : retrieved_docs }
+                if len(results_by_query) > 1:
+                    json_result["results_by_query"] = [
+                        {"query": q, "results": docs} for q, docs in results_by_query
+                    ]
                 yield self.create_json_message(json_result)
             else:
-                text = ""  # 👉 UI で扱いやすいよう順位 / 本文のみをシリアライズ
-                sorted_docs = sorted(
-                    retrieved_docs,
-                    key=lambda res: res.get("metadata", {}).get("position", 0),
-                )
-                for i, res in enumerate(sorted_docs):
-                    text += f"{i + 1}: {res['content']}\n"
-                yield self.create_text_message(text)
+                parts = []  # 👉 UI で扱いやすいよう順位 / 本文のみをシリアライズし、最後に一度だけ連結する
+                for q, docs in results_by_query:
+                    if len(results_by_query) > 1:
+                        parts.append(f"## {q}\n")
+                    # 👉 convert_to_dify_kb_format が順位どおり (position 昇順) に並べているので並べ替えは不要
+                    parts.extend(f"{i + 1}: {res['content']}\n" for i, res in enumerate(docs))
+                yield self.create_text_message("".join(parts))
 
         except Exception as e:
+            # 例外が発生した _invoke 内の行はトレースバックから取得する (段階ごとの番号を都度代入しない)
+            line = e.__traceback__.tb_lineno if e.__traceback__ else None
             yield self.create_text_message(f"Exception {str(e)}, line : {line}")
 
     def validate_parameters(self, parameters: dict[str, Any]) -> None:
@@ -199,5 +253,8 @@ class BedrockRetrieveTool(Tool):
             raise ValueError("query is required")
 
         metadata_filter_str = parameters.get("metadata_filter")
-        if metadata_filter_str and not isinstance(json.loads(metadata_filter_str), dict):
-            raise ValueError("metadata_filter must be a valid JSON object")
+        if metadata_filter_str:
+            metadata_filter = _json.loads(metadata_filter_str)
+            if not isinstance(metadata_filter, dict):
+                raise ValueError("metadata_filter must be a valid JSON object")
+            self._parsed_json_parameters = {metadata_filter_str: metadata_filter}
@@ -4,22 +4,34 @@
 目的: Workflow から単一呼び出しで検索結果と引用付きの回答を得られるようにする。
 """
 
-import json
-from typing import Any
+from typing import Any, Optional
 from collections.abc import Generator
 
-import boto3
-
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from provider.utils import (
+    get_cached_client,
     resolve_aws_credentials,
-    build_boto3_client_kwargs,
     reset_clients_on_credential_change,
 )
 
+try:
+    import orjson as _json  # type: ignore
+except ImportError:  # pragma: no cover - orjson は任意依存
+    import json as _json
+
+
 class BedrockRetrieveAndGenerateTool(Tool):
     bedrock_client: Any = None
+    # validate_parameters で解析した JSON 文字列 → 解析結果 (_invoke で同じ文字列を再解析しないため)
+    _parsed_json_parameters: Optional[dict] = None
+
+    def _load_json_parameter(self, raw: str) -> Any:
+        """JSON 文字列パラメータを dict へ展開する. validate_parameters で解析済みならその結果を使う."""
+        parsed_parameters = self._parsed_json_parameters or {}
+        if raw in parsed_parameters:
+            return parsed_parameters.pop(raw)
+        return _json.loads(raw)
 
     def _format_text_with_citations(self, result: dict[str, Any]) -> str:
         """生成結果と引用情報を行単位で整形し、人が読みやすい書式にまとめる."""
@@ -31,16 +43,60 @@ class BedrockRetrieveAndGenerateTool(Tool):
         if citations:
             lines.append("\n[References]")
             for idx, citation in enumerate(citations, start=1):
-                ref_lines = []
-                for ref in citation.get("references", []):
-                    location = ref.get("location") or ""
-                    ref_lines.append(f"- {ref.get('content', '').strip()} {location}".rstrip())
-                text = citation.get("text", "").strip()
-                joined_refs = "\n".join(ref_lines) if ref_lines else "- (metadata only)"
-                lines.append(f"[{idx}] {text}\n{joined_refs}")
+                # 👉 見出し行と参照行を同じリストへ直接積み、最後の join 1 回で連結する
+                lines.append(f"[{idx}] {citation.get('text', '').strip()}")
+                references = citation.get("references", [])
+                if references:
+                    lines.extend(
+                        f"- {ref.get('content', '').strip()} {ref.get('location') or ''}".rstrip()
+                        for ref in references
+                    )
+                else:
+                    lines.append("- (metadata only)")
 
         return "\n".join(lines) if lines else ""
 
+    @staticmethod
+    def _convert_citation(citation: dict[str, Any]) -> dict[str, Any]:
+        """引用リストを UI 表示 / 後段プロンプト双方で扱える構造に揃える."""
+        citation_info = {
+            "text": citation.get("generatedResponsePart", {}).get("textResponsePart", {}).get("text", ""),
+            "references": [],
+        }
+
+        for ref in citation.get("retrievedReferences", []):
+            reference = {
+                "content": ref.get("content", {}).get("text", ""),
+                "metadata": ref.get("metadata", {}),
+                "location": None,
+            }
+
+            location = ref.get("location", {})
+            if location.get("type") == "S3":
+                reference["location"] = location.get("s3Location", {}).get("uri")
+
+            citation_info["references"].append(reference)
+
+        return citation_info
+
+    def _stream_text(self, request_config: dict[str, Any], with_citations: bool) -> Generator[ToolInvokeMessage]:
+        """retrieve_and_generate_stream のイベントを受け取り次第テキストメッセージとして返す."""
+        response = self.bedrock_client.retrieve_and_generate_stream(**request_config)
+
+        citations = []
+        for event in response["stream"]:
+            if "output" in event:
+                if chunk := event["output"].get("text"):
+                    yield self.create_text_message(chunk)
+            elif "citation" in event and with_citations:
+                # 👉 新しい形式はイベント直下、古い形式は citation キー配下に引用が入る
+                citation_event = event["citation"]
+                citations.append(self._convert_citation(citation_event.get("citation") or citation_event))
+
+        # 👉 引用は本文をすべて返したあとにまとめて付ける
+        if citations:
+            yield self.create_text_message("\n" + self._format_text_with_citations({"citations": citations}))
+
     def _invoke(
         self,
         tool_parameters: dict[str, Any],
@@ -52,9 +108,7 @@ class BedrockRetrieveAndGenerateTool(Tool):
 
             # 👉 boto3 クライアントをシングルトンにして呼び出しごとのオーバーヘッドを抑える
             if not self.bedrock_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                client_kwargs["service_name"] = "bedrock-agent-runtime"
-                self.bedrock_client = boto3.client(**client_kwargs)
+                self.bedrock_client = get_cached_client("bedrock-agent-runtime", credentials)
         except Exception as e:
             yield self.create_text_message(f"Failed to initialize Bedrock client: {str(e)}")
 
@@ -73,18 +127,28 @@ class BedrockRetrieveAndGenerateTool(Tool):
             # 👉 選択されたモードごとに期待される JSON を埋め込む
             if config_type == "KNOWLEDGE_BASE":
                 kb_config_str = tool_parameters.get("knowledge_base_configuration")
-                kb_config = json.loads(kb_config_str) if kb_config_str else None
+                kb_config = self._load_json_parameter(kb_config_str) if kb_config_str else None
                 retrieve_generate_config["knowledgeBaseConfiguration"] = kb_config
             else:  # EXTERNAL_SOURCES
                 es_config_str = tool_parameters.get("external_sources_configuration")
-                es_config = json.loads(es_config_str) if es_config_str else None
+                es_config = self._load_json_parameter(es_config_str) if es_config_str else None
                 retrieve_generate_config["externalSourcesConfiguration"] = es_config
 
+            # 👉 レイテンシー最適化推論は生成設定 (generationConfiguration) 側で指定する。明示設定があればそちらを優先
+            if tool_parameters.get("latency_optimized"):
+                source_config = retrieve_generate_config.get("knowledgeBaseConfiguration") or retrieve_generate_config.get(
+                    "externalSourcesConfiguration"
+                )
+                if isinstance(source_config, dict):
+                    source_config.setdefault("generationConfiguration", {}).setdefault(
+                        "performanceConfig", {"latency": "optimized"}
+                    )
+
             request_config["retrieveAndGenerateConfiguration"] = retrieve_generate_config
 
             # 👉 セッション設定／セッションID を渡すと Bedrock 側で会話状態を保持できる
             session_config_str = tool_parameters.get("session_configuration")
-            session_config = json.loads(session_config_str) if session_config_str else None
+            session_config = self._load_json_parameter(session_config_str) if session_config_str else None
             if session_config:
                 request_config["sessionConfiguration"] = session_config
 
@@ -93,42 +157,24 @@ class BedrockRetrieveAndGenerateTool(Tool):
             if session_id:
                 request_config["sessionId"] = session_id
 
+            result_type = tool_parameters.get("result_type")
+            if result_type != "json":
+                # 👉 テキスト出力ではストリーミング API を使い、生成されたチャンクから順に返す
+                yield from self._stream_text(request_config, with_citations=result_type == "text-with-citations")
+                return
+
             # 👉 ここまでで構築した設定を Bedrock へ送信
             response = self.bedrock_client.retrieve_and_generate(**request_config)
 
             # 👉 Bedrock から返る本文と引用情報を Dify 側で使いやすい dict に変換
-            result = {"output": response.get("output", {}).get("text", ""), "citations": []}
-
-            # 👉 引用リストは UI 表示 / 後段プロンプト双方で扱える構造に揃える
-            for citation in response.get("citations", []):
-                citation_info = {
-                    "text": citation.get("generatedResponsePart", {}).get("textResponsePart", {}).get("text", ""),
-                    "references": [],
-                }
-
-                for ref in citation.get("retrievedReferences", []):
-                    reference = {
-                        "content": ref.get("content", {}).get("text", ""),
-                        "metadata": ref.get("metadata", {}),
-                        "location": None,
-                    }
-
-                    location = ref.get("location", {})
-                    if location.get("type") == "S3":
-                        reference["location"] = location.get("s3Location", {}).get("uri")
-
-                    citation_info["references"].append(reference)
-
-                result["citations"].append(citation_info)
-            result_type = tool_parameters.get("result_type")
-            if result_type == "json":
-                yield self.create_json_message(result)
-            elif result_type == "text-with-citations":
-                text_with_refs = self._format_text_with_citations(result)
-                yield self.create_text_message(text_with_refs)
-            else:
-                yield self.create_text_message(result.get("output"))
-        except json.JSONDecodeError as e:
+            # 👉 session_id を返しておけば、次のターンで同じセッション (サーバー側の会話状態) を再利用できる
+            result = {
+                "output": response.get("output", {}).get("text", ""),
+                "citations": [self._convert_citation(citation) for citation in response.get("citations", [])],
+                "session_id": response.get("sessionId"),
+            }
+            yield self.create_json_message(result)
+        except _json.JSONDecodeError as e:
             yield self.create_text_message(f"Invalid JSON format: {str(e)}")
         except Exception as e:
             yield self.create_text_message(f"Tool invocation error: {str(e)}")
@@ -143,12 +189,15 @@ class BedrockRetrieveAndGenerateTool(Tool):
 
         # 👉 JSON 文字列で渡される構成情報を事前に validate
         json_configs = ["knowledge_base_configuration", "external_sources_configuration", "session_configuration"]
+        parsed_parameters = {}
         for config in json_configs:
             if config_value := parameters.get(config):
                 try:
-                    json.loads(config_value)
-                except json.JSONDecodeError:
+                    parsed_parameters[config_value] = _json.loads(config_value)
+                except _json.JSONDecodeError:
                     raise ValueError(f"{config} must be a valid JSON string")
+        # 👉 解析結果は _invoke で再利用する
+        self._parsed_json_parameters = parsed_parameters
 
         # 👉 type が想定値かどうか確認
         config_type = parameters.get("type")
@@ -5,22 +5,48 @@
 """
 
 import json
+import time
 from typing import Any
-import boto3
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
 from botocore.exceptions import ClientError
 from collections.abc import Generator
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from provider.utils import (
+    get_cached_client,
     resolve_aws_credentials,
-    build_boto3_client_kwargs,
     reset_clients_on_credential_change,
 )
 
+try:
+    from orjson import loads as _json_loads  # type: ignore
+except ImportError:  # pragma: no cover - orjson は任意依存
+    from json import loads as _json_loads
+
+# BatchWriteItem は 1 リクエスト 25 件、BatchGetItem は 100 キーまで
+BATCH_WRITE_MAX_ITEMS = 25
+BATCH_GET_MAX_KEYS = 100
+# 未処理分 (UnprocessedItems / UnprocessedKeys) を再送する回数と初回の待ち時間 (秒)。待ち時間は再送ごとに倍にする
+BATCH_MAX_RETRIES = 5
+BATCH_BACKOFF_SECONDS = 0.05
+
+# 低レベルクライアントとの間で Python の値と DynamoDB の型付き表現を相互変換する (スレッドセーフで共有可能)
+_SERIALIZER = TypeSerializer()
+_DESERIALIZER = TypeDeserializer()
+
+
+def _serialize_item(item: dict) -> dict:
+    """Python の dict を DynamoDB の属性値マップへ変換する."""
+    return {key: _SERIALIZER.serialize(value) for key, value in item.items()}
+
+
+def _deserialize_item(item: dict) -> dict:
+    """DynamoDB の属性値マップを Python の dict へ戻す."""
+    return {key: _DESERIALIZER.deserialize(value) for key, value in item.items()}
+
 
 class DynamoDBManager(Tool):
-    dynamodb_resource: Any = None
     dynamodb_client: Any = None
 
     def _invoke(
@@ -33,17 +59,11 @@ class DynamoDBManager(Tool):
             if tool_parameters.get("aws_region"):
                 credentials["aws_region"] = tool_parameters.get("aws_region")
 
-            reset_clients_on_credential_change(
-                self,
-                credentials,
-                ["dynamodb_resource", "dynamodb_client"],
-            )
+            reset_clients_on_credential_change(self, credentials, ["dynamodb_client"])
 
-            # クライアントとリソースを遅延初期化
-            if not self.dynamodb_resource or not self.dynamodb_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                self.dynamodb_resource = boto3.resource("dynamodb", **client_kwargs)
-                self.dynamodb_client = boto3.client("dynamodb", **client_kwargs)
+            # 低レベルクライアントを遅延初期化 (資格情報ごとにプロセス全体で共有)
+            if not self.dynamodb_client:
+                self.dynamodb_client = get_cached_client("dynamodb", credentials)
 
             operation_type = tool_parameters.get("operation_type")
 
@@ -55,6 +75,10 @@ class DynamoDBManager(Tool):
                 result = self._get_item(tool_parameters)
             elif operation_type == "delete_item":
                 result = self._delete_item(tool_parameters)
+            elif operation_type == "batch_put_item":
+                result = self._batch_put_item(tool_parameters)
+            elif operation_type == "batch_get_item":
+                result = self._batch_get_item(tool_parameters)
             else:
                 result = f"Unsupported operation: {operation_type}"
 
@@ -80,13 +104,13 @@ class DynamoDBManager(Tool):
             attribute_definitions.append({"AttributeName": sort_key_name, "AttributeType": "S"})
 
         try:
-            table = self.dynamodb_resource.create_table(
+            self.dynamodb_client.create_table(
                 TableName=table_name,
                 KeySchema=key_schema,
                 AttributeDefinitions=attribute_definitions,
                 BillingMode="PAY_PER_REQUEST"
             )
-            table.wait_until_exists()
+            self.dynamodb_client.get_waiter("table_exists").wait(TableName=table_name)
             return f"Table {table_name} created successfully"
         except ClientError as e:
             if e.response["Error"]["Code"] == "ResourceInUseException":
@@ -110,12 +134,11 @@ class DynamoDBManager(Tool):
             item[sort_key_name] = sort_key
 
         if isinstance(item_data, str):
-            item_data = json.loads(item_data)
+            item_data = _json_loads(item_data)
 
         item.update(item_data)
         
-        table = self.dynamodb_resource.Table(table_name)
-        table.put_item(Item=item)
+        self.dynamodb_client.put_item(TableName=table_name, Item=_serialize_item(item))
         return f"Item added to {table_name} successfully"
 
     def _get_item(self, params: dict) -> str:
@@ -133,12 +156,12 @@ class DynamoDBManager(Tool):
         if sort_key_name and sort_key:
             key_data[sort_key_name] = sort_key
         
-        table = self.dynamodb_resource.Table(table_name)
-
-        response = table.get_item(
-            Key=key_data
+        response = self.dynamodb_client.get_item(
+            TableName=table_name,
+            Key=_serialize_item(key_data)
         )
-        return response.get('Item')
+        item = response.get('Item')
+        return _deserialize_item(item) if item is not None else None
 
     def _delete_item(self, params: dict) -> str:
         """項目を DynamoDB テーブルから削除する."""
@@ -155,6 +178,83 @@ class DynamoDBManager(Tool):
         if sort_key_name and sort_key:
             key_data[sort_key_name] = sort_key
         
-        table = self.dynamodb_resource.Table(table_name)
-        table.delete_item(Key=key_data)
+        self.dynamodb_client.delete_item(TableName=table_name, Key=_serialize_item(key_data))
         return f"Item deleted from {table_name} successfully"
+
+    @staticmethod
+    def _load_item_list(params: dict) -> list:
+        """item_data を JSON 配列として読み込む (バッチ操作用)."""
+        items = params.get("item_data")
+        if isinstance(items, str):
+            items = _json_loads(items)
+        if not isinstance(items, list):
+            raise ValueError("item_data must be a JSON array for batch operations")
+        return items
+
+    @staticmethod
+    def _key_identity(item: dict, key_names: list) -> str:
+        """キー属性だけを取り出した重複判定用の文字列を作る."""
+        return json.dumps({name: item.get(name) for name in key_names}, sort_keys=True, default=str)
+
+    def _send_with_retry(self, operation, request_items: dict, unprocessed_field: str) -> list:
+        """バッチ API を呼び、未処理分だけを指数バックオフしながら再送する. 各レスポンスを順に返す."""
+        responses = []
+        delay = BATCH_BACKOFF_SECONDS
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            response = operation(RequestItems=request_items)
+            responses.append(response)
+            request_items = response.get(unprocessed_field) or {}
+            if not request_items:
+                return responses
+            if attempt == BATCH_MAX_RETRIES:
+                break
+            # スロットリング時は未処理分が返るので、待ってから残りだけ再送する
+            time.sleep(delay)
+            delay *= 2
+        raise RuntimeError(f"Some requests remained unprocessed after {BATCH_MAX_RETRIES} retries")
+
+    def _batch_put_item(self, params: dict) -> str:
+        """item_data の配列を BatchWriteItem で 25 件ずつまとめて書き込む."""
+        table_name = params.get("table_name")
+        partition_key_name = params.get("partition_key_name")
+        sort_key_name = params.get("sort_key_name")
+        items = self._load_item_list(params)
+
+        # 同じキーが複数回現れた場合は後勝ちにして、1 バッチ内の重複キーエラーを避ける
+        key_names = [partition_key_name, sort_key_name] if sort_key_name else [partition_key_name]
+        items_by_identity = {}
+        for item in items:
+            items_by_identity[self._key_identity(item, key_names)] = item
+        unique_items = list(items_by_identity.values())
+
+        for start in range(0, len(unique_items), BATCH_WRITE_MAX_ITEMS):
+            chunk = unique_items[start:start + BATCH_WRITE_MAX_ITEMS]
+            request_items = {table_name: [{"PutRequest": {"Item": _serialize_item(item)}} for item in chunk]}
+            self._send_with_retry(self.dynamodb_client.batch_write_item, request_items, "UnprocessedItems")
+        return f"{len(items)} items added to {table_name} successfully"
+
+    def _batch_get_item(self, params: dict) -> dict:
+        """item_data に並べたキーを BatchGetItem で 100 件ずつまとめて取得する.
+
+        各要素はキー属性を持つオブジェクト。ソートキーが無いテーブルではパーティションキー値だけでもよい。
+        """
+        table_name = params.get("table_name")
+        partition_key_name = params.get("partition_key_name")
+
+        # BatchGetItem は重複キーを受け付けないため、順序を保ったまま重複を除く
+        keys_by_identity = {}
+        for key in self._load_item_list(params):
+            if not isinstance(key, dict):
+                key = {partition_key_name: key}
+            keys_by_identity.setdefault(json.dumps(key, sort_keys=True, default=str), key)
+        keys = list(keys_by_identity.values())
+
+        items = []
+        for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+            request_items = {
+                table_name: {"Keys": [_serialize_item(key) for key in keys[start:start + BATCH_GET_MAX_KEYS]]}
+            }
+            for response in self._send_with_retry(self.dynamodb_client.batch_get_item, request_items, "UnprocessedKeys"):
+                items.extend(_deserialize_item(item) for item in response.get("Responses", {}).get(table_name, []))
+
+        return {"items": items}
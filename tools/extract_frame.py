@@ -1,30 +1,47 @@
 """
 場所: tools/extract_frame.py
 内容: GIF ファイルから均等間隔で指定枚数のフレームを抽出し、Dify から扱える PNG で返す。
-目的: URL で渡された GIF を一時保存し、Workflow へ画像バイナリを配信できるようにする。
+目的: URL で渡された GIF をメモリ上で処理し、Workflow へ画像バイナリを配信できるようにする。
 """
 
 from typing import Any, Generator
+import io
+import logging
 import os
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from PIL import Image
+import requests.adapters
+from PIL import Image, ImageSequence
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
+logger = logging.getLogger(__name__)
+
+# GIF ダウンロード用の共有セッション。Keep-Alive で TCP/TLS 接続を呼び出し間で使い回す
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=16))
+_HTTP_SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+# 速度優先の PNG 圧縮レベル (既定の 6 よりわずかにサイズは増えるがエンコードは数倍速い)
+PNG_COMPRESS_LEVEL = 1
+
 class FrameExtractor(Tool):
-    def _extract_specific_frames(self, gif_path, output_folder, frame_count=5):
-        """GIF から指定枚数のフレームを均等に抜き出し、PNG ファイルで保存する補助."""
-        # 出力フォルダが無ければ作成
-        os.makedirs(output_folder, exist_ok=True)
+    @staticmethod
+    def _encode_png(frame) -> bytes:
+        """フレームをディスクを介さずに PNG バイト列へエンコードする."""
+        buffer = io.BytesIO()
+        frame.save(buffer, format="PNG", optimize=False, compress_level=PNG_COMPRESS_LEVEL)
+        return buffer.getvalue()
 
+    def _extract_specific_frames(self, gif_file, frame_count=5):
+        """GIF から指定枚数のフレームを均等に抜き出し、PNG のバイト列で返す補助."""
         # GIF を開く
-        gif = Image.open(gif_path)
+        gif = Image.open(gif_file)
 
         # 総フレーム数を取得
         total_frames = gif.n_frames
-        print(f"GIF共有 {total_frames} 帧")
+        logger.debug("GIF has %d frames", total_frames)
 
         # 抽出するフレーム番号の配列を計算
         if frame_count == 2:
@@ -43,73 +60,56 @@ class FrameExtractor(Tool):
                 if frames_to_extract[-1] != total_frames - 1:
                     frames_to_extract[-1] = total_frames - 1
 
-        # 実際にフレームを抽出して保存
-        extracted_paths = []
-        for i, frame_idx in enumerate(frames_to_extract):
-            gif.seek(frame_idx)
-            frame = gif.copy()
-            output_path = os.path.join(output_folder, f"frame_{i:03d}.png")
-            frame.save(output_path)
-            extracted_paths.append(output_path)
-            print(f"已保存第 {frame_idx+1}/{total_frames} 帧 (索引 {frame_idx})")
-
-        print(f"已提取 {len(extracted_paths)} 帧!")
-        return extracted_paths
-
-    def _clean_temp_dir(self, temp_dir):
-        """一時ディレクトリを削除するユーティリティ."""
-        try:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-                print(f"已删除临时目录: {temp_dir}")
-        except Exception as e:
-            print(f"删除临时目录时出错: {str(e)}")
+        # GIF のデコードは前フレームとの合成が必要なため、seek ごとにやり直さず先頭から 1 回だけ走査する。
+        # PNG の圧縮 (zlib) は GIL を解放するので、デコードを続けながら対象フレームのエンコードをスレッドで並列に進める
+        targets = set(frames_to_extract)
+        last_target = max(frames_to_extract)
+        pending = {}
+        with ThreadPoolExecutor(max_workers=min(len(targets), os.cpu_count() or 1)) as executor:
+            for frame_idx, frame in enumerate(ImageSequence.Iterator(gif)):
+                if frame_idx in targets:
+                    # イテレーターは同じ画像オブジェクトを次のフレームで上書きするため、
+                    # 後続フレームをデコードする場合だけコピーする (最後の対象フレームはそのまま使う)
+                    image = frame if frame_idx >= last_target else frame.copy()
+                    pending[frame_idx] = executor.submit(self._encode_png, image)
+                if frame_idx >= last_target:
+                    break
+            extracted_frames = [pending[frame_idx].result() for frame_idx in frames_to_extract]
+
+        logger.debug("Extracted %d frames (indices %s)", len(extracted_frames), frames_to_extract)
+        return extracted_frames
 
     def _invoke(
         self,
         tool_parameters: dict[str, Any],
     ) -> Generator[ToolInvokeMessage, None, None]:
         """入力 URL から GIF を取得し、抽出フレームを PNG として返却する."""
-        temp_dir = os.path.join(os.path.dirname(__file__), "temp")
         try:
             input_url = tool_parameters.get("input_url")
             frame_count = int(tool_parameters.get("frame_count", 5))  # 默认提取5帧
             input_type = tool_parameters.get("input_type", "GIF")  # 默认为GIF类型
 
-            # 一時ディレクトリを作成
-            os.makedirs(temp_dir, exist_ok=True)
-
-            # 入力 GIF やフレームを書き出すパスを用意
-            gif_path = os.path.join(temp_dir, "input.gif")
-            output_folder = os.path.join(temp_dir, "frames")
-
             # 入力タイプごとの処理
-            if input_type == "GIF":
-                # URL から GIF をダウンロード
-                response = requests.get(input_url, stream=True)
-                if response.status_code == 200:
-                    with open(gif_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                else:
-                    yield self.create_text_message(f"下载GIF失败 - {input_url}，状态码: {response.status_code}")
-            else:
+            if input_type != "GIF":
                 yield self.create_text_message(f"只支持GIF格式。")
+                return
+
+            # URL から GIF をダウンロードし、一時ファイルを介さずメモリ上のバッファから PIL で開く
+            with _HTTP_SESSION.get(input_url, stream=True) as response:
+                if response.status_code != 200:
+                    yield self.create_text_message(f"下载GIF失败 - {input_url}，状态码: {response.status_code}")
+                    return
+                gif_buffer = io.BytesIO()
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    gif_buffer.write(chunk)
+            gif_buffer.seek(0)
+
+            # フレームを抽出し、メモリ上でエンコードした PNG をそのままバイナリとして返却
+            for frame_content in self._extract_specific_frames(gif_buffer, frame_count):
+                yield self.create_blob_message(
+                    blob=frame_content,
+                    meta={"mime_type": "image/png"}
+                )
 
-            # フレームを抽出
-            extracted_paths = self._extract_specific_frames(gif_path, output_folder, frame_count)
-
-            # PNG をバイナリとして返却
-            for path in extracted_paths:
-                with open(path, 'rb') as f:
-                    frame_content = f.read()
-                    yield self.create_blob_message(
-                        blob=frame_content, 
-                        meta={"mime_type": "image/png"}
-                    )
-                    
         except Exception as e:
             yield self.create_text_message(f"提取帧时出错: {str(e)}")
-        finally:
-            # 成否に関わらず一時ディレクトリを削除
-            self._clean_temp_dir(temp_dir)
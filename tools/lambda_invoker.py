@@ -6,12 +6,10 @@
 
 from __future__ import annotations
 
-import base64
 import json
 from collections.abc import Generator
 from typing import Any
 
-import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 
 from dify_plugin import Tool
@@ -19,17 +17,29 @@ from dify_plugin.entities.tool import ToolInvokeMessage
 
 try:
     from my_aws_tools.provider.utils import (
-        build_boto3_client_kwargs,
+        dumps_json_bytes,
+        get_cached_client,
+        loads_json,
         resolve_aws_credentials,
         reset_clients_on_credential_change,
     )
 except ModuleNotFoundError:  # pragma: no cover
     from provider.utils import (
-        build_boto3_client_kwargs,
+        dumps_json_bytes,
+        get_cached_client,
+        loads_json,
         resolve_aws_credentials,
         reset_clients_on_credential_change,
     )
 
+try:
+    import pybase64 as base64  # type: ignore
+except ImportError:  # pragma: no cover - pybase64 は任意依存
+    import base64
+
+# pybase64 があれば bytes への追加コピーを作らない bytearray 版でデコードする
+_b64decode = getattr(base64, "b64decode_as_bytearray", base64.b64decode)
+
 
 class LambdaInvokerTool(Tool):
     lambda_client: Any | None = None
@@ -37,8 +47,7 @@ class LambdaInvokerTool(Tool):
     def _ensure_client(self, credentials: dict[str, Any]) -> None:
         reset_clients_on_credential_change(self, credentials, ["lambda_client"])
         if not self.lambda_client:
-            client_kwargs = build_boto3_client_kwargs(credentials)
-            self.lambda_client = boto3.client("lambda", **client_kwargs)
+            self.lambda_client = get_cached_client("lambda", credentials)
 
     def _load_json(
         self,
@@ -49,10 +58,7 @@ class LambdaInvokerTool(Tool):
         if value in (None, ""):
             return default, None
         if isinstance(value, (dict, list)):
-            try:
-                json.dumps(value)
-            except (TypeError, ValueError) as exc:
-                return None, f"{param_name} must be JSON serializable: {exc}"
+            # シリアライズ可否は送信時の一度きりのエンコードで判定する
             return value, None
         if not isinstance(value, str):
             return None, f"{param_name} must be a JSON string or object"
@@ -63,15 +69,6 @@ class LambdaInvokerTool(Tool):
         return parsed, None
 
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
-        try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters["aws_region"]
-            self._ensure_client(credentials)
-        except Exception as exc:  # pragma: no cover - boto3 init failures are rare
-            yield self.create_text_message(f"Failed to initialize AWS client: {exc}")
-            return
-
         lambda_name = tool_parameters.get("lambda_name")
         if not lambda_name:
             yield self.create_text_message("lambda_name parameter is required")
@@ -93,6 +90,30 @@ class LambdaInvokerTool(Tool):
             yield self.create_text_message(context_error)
             return
 
+        try:
+            payload_bytes = dumps_json_bytes(payload_obj or {})
+        except (TypeError, ValueError) as exc:
+            yield self.create_text_message(f"payload_json must be JSON serializable: {exc}")
+            return
+
+        encoded_context = None
+        if client_context:
+            try:
+                encoded_context = base64.b64encode(dumps_json_bytes(client_context)).decode("utf-8")
+            except (TypeError, ValueError) as exc:
+                yield self.create_text_message(f"client_context_json must be JSON serializable: {exc}")
+                return
+
+        # 入力検証を通過した呼び出しだけが認証情報の解決とクライアント準備を行う
+        try:
+            credentials = resolve_aws_credentials(self, tool_parameters)
+            if tool_parameters.get("aws_region"):
+                credentials["aws_region"] = tool_parameters["aws_region"]
+            self._ensure_client(credentials)
+        except Exception as exc:  # pragma: no cover - boto3 init failures are rare
+            yield self.create_text_message(f"Failed to initialize AWS client: {exc}")
+            return
+
         invocation_type = tool_parameters.get("invocation_type", "RequestResponse")
         qualifier = tool_parameters.get("qualifier")
         include_logs = bool(tool_parameters.get("include_logs"))
@@ -100,14 +121,13 @@ class LambdaInvokerTool(Tool):
         invoke_kwargs: dict[str, Any] = {
             "FunctionName": lambda_name,
             "InvocationType": invocation_type,
-            "Payload": json.dumps(payload_obj or {}, ensure_ascii=False).encode("utf-8"),
+            "Payload": payload_bytes,
         }
         if qualifier:
             invoke_kwargs["Qualifier"] = qualifier
         if include_logs:
             invoke_kwargs["LogType"] = "Tail"
-        if client_context:
-            encoded_context = base64.b64encode(json.dumps(client_context, ensure_ascii=False).encode("utf-8")).decode("utf-8")
+        if encoded_context:
             invoke_kwargs["ClientContext"] = encoded_context
 
         try:
@@ -117,14 +137,17 @@ class LambdaInvokerTool(Tool):
             yield self.create_text_message(f"Failed to invoke Lambda: {message}")
             return
 
-        payload_stream = response.get("Payload")
-        response_text = payload_stream.read().decode("utf-8") if payload_stream else ""
+        # Event/DryRun ではレスポンス本文が空なので読み取りと解析を省略する
+        payload_stream = response.get("Payload") if invocation_type == "RequestResponse" else None
+        response_bytes = payload_stream.read() if payload_stream else b""
         response_json: Any | None = None
-        if response_text:
+        response_text = ""
+        if response_bytes:
+            # JSON はバイト列のまま解析し、解析できない場合のみテキストへデコードする
             try:
-                response_json = json.loads(response_text)
-            except json.JSONDecodeError:
-                response_json = None
+                response_json = loads_json(response_bytes)
+            except ValueError:
+                response_text = response_bytes.decode("utf-8")
 
         result_payload: dict[str, Any] = {
             "function_name": lambda_name,
@@ -141,7 +164,7 @@ class LambdaInvokerTool(Tool):
 
         if include_logs and response.get("LogResult"):
             try:
-                decoded_logs = base64.b64decode(response["LogResult"]).decode("utf-8", errors="ignore")
+                decoded_logs = _b64decode(response["LogResult"]).decode("utf-8", errors="ignore")
                 result_payload["logs"] = decoded_logs
             except Exception:  # pragma: no cover - corrupted log only
                 result_payload["logs"] = "Failed to decode logs"
@@ -149,7 +172,10 @@ class LambdaInvokerTool(Tool):
         yield self.create_json_message(result_payload)
 
         if response_json is not None:
-            text_output = json.dumps(response_json, ensure_ascii=False)
+            # 受信した JSON 文字列をそのまま使い、\uXXXX エスケープを含む場合だけ読める形へ再エンコードする
+            text_output = response_bytes.decode("utf-8")
+            if "\\u" in text_output:
+                text_output = json.dumps(response_json, ensure_ascii=False)
         elif response_text:
             text_output = response_text
         else:
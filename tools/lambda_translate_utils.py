@@ -5,25 +5,30 @@
 """
 
 import json
-from typing import Any, Union
+from typing import Any, Optional, Union
 from collections.abc import Generator
 
-import boto3  # type: ignore
-
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from provider.utils import (
+    dumps_json_bytes,
+    get_cached_client,
+    loads_json,
     resolve_aws_credentials,
-    build_boto3_client_kwargs,
     reset_clients_on_credential_change,
 )
 
+# text_content 以外に Lambda 呼び出しへ必須のパラメータ (チェック順)。dictionary_name は YAML 上任意のため含めない
+REQUIRED_PARAMETERS = ("src_lang", "dest_lang", "lambda_name", "request_type", "model_id")
+
+
 class LambdaTranslateUtilsTool(Tool):
     lambda_client: Any = None
 
-    def _invoke_lambda(self, text_content, src_lang, dest_lang, model_id, dictionary_name, request_type, lambda_name):
+    def _invoke_lambda(self, src_contents, src_lang, dest_lang, model_id, dictionary_name, request_type, lambda_name):
+        """Lambda を 1 回呼び出し、(表示用テキスト, 解析済み JSON または None) を返す."""
         msg = {
-            "src_contents": [text_content],
+            "src_contents": src_contents,
             "src_lang": src_lang,
             "dest_lang": dest_lang,
             "dictionary_id": dictionary_name,
@@ -32,70 +37,98 @@ class LambdaTranslateUtilsTool(Tool):
         }
 
         invoke_response = self.lambda_client.invoke(
-            FunctionName=lambda_name, InvocationType="RequestResponse", Payload=json.dumps(msg)
+            FunctionName=lambda_name, InvocationType="RequestResponse", Payload=dumps_json_bytes(msg)
         )
         response_body = invoke_response["Payload"]
 
-        response_str = response_body.read().decode("unicode_escape")  # Lambda 側の結果をそのまま返す
+        response_bytes = response_body.read()
 
-        return response_str
+        # Lambda 側の結果をそのまま返す。JSON の \uXXXX エスケープは解析して読める文字へ戻す
+        try:
+            parsed = loads_json(response_bytes)
+        except ValueError:
+            return response_bytes.decode("utf-8"), None
+        return json.dumps(parsed, ensure_ascii=False), parsed
+
+    @staticmethod
+    def _parse_text_contents(value: Any) -> list[str]:
+        """text_contents を JSON 配列または改行区切りの文字列として受け取り、空要素を除いたリストにする."""
+        if isinstance(value, list):
+            items = value
+        elif isinstance(value, str) and value.strip():
+            try:
+                items = json.loads(value)
+            except json.JSONDecodeError:
+                items = value.splitlines()
+            if not isinstance(items, list):
+                items = [value]
+        else:
+            return []
+        return [str(item) for item in items if str(item).strip()]
+
+    @staticmethod
+    def _split_batch_results(src_contents: list[str], parsed: Any) -> Optional[list[dict[str, Any]]]:
+        """レスポンス中の入力と同じ件数のリストを探し、入力ごとの結果へ対応付ける."""
+        if isinstance(parsed, list):
+            candidates = [parsed]
+        elif isinstance(parsed, dict):
+            candidates = [value for value in parsed.values() if isinstance(value, list)]
+        else:
+            candidates = []
+        for candidate in candidates:
+            if len(candidate) == len(src_contents):
+                return [
+                    {"text_content": text, "result": result} for text, result in zip(src_contents, candidate)
+                ]
+        return None
 
     def _invoke(
         self,
         tool_parameters: dict[str, Any],
     ) -> Generator[ToolInvokeMessage]:
         """Lambda 呼び出し前に必須パラメータをチェックし、翻訳結果をテキストで返す."""
-        line = 0
         try:
+            text_content = tool_parameters.get("text_content", "")
+            # 複数テキストは 1 回の Lambda 呼び出しにまとめて送信する
+            text_contents = self._parse_text_contents(tool_parameters.get("text_contents"))
+            if not text_content and not text_contents:
+                yield self.create_text_message("Please input text_content")
+                return
+
+            # 不足があれば Lambda を呼び出さずに終了する
+            for name in REQUIRED_PARAMETERS:
+                if not tool_parameters.get(name):
+                    yield self.create_text_message(f"Please input {name}")
+                    return
+
             credentials = resolve_aws_credentials(self, tool_parameters)
             if tool_parameters.get("aws_region"):
                 credentials["aws_region"] = tool_parameters.get("aws_region")
             reset_clients_on_credential_change(self, credentials, ["lambda_client"])
 
             if not self.lambda_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                self.lambda_client = boto3.client("lambda", **client_kwargs)
-
-            line = 1
-            text_content = tool_parameters.get("text_content", "")
-            if not text_content:
-                yield self.create_text_message("Please input text_content")
-
-            line = 2
-            src_lang = tool_parameters.get("src_lang", "")
-            if not src_lang:
-                yield self.create_text_message("Please input src_lang")
-
-            line = 3
-            dest_lang = tool_parameters.get("dest_lang", "")
-            if not dest_lang:
-                yield self.create_text_message("Please input dest_lang")
-
-            line = 4
-            lambda_name = tool_parameters.get("lambda_name", "")
-            if not lambda_name:
-                yield self.create_text_message("Please input lambda_name")
-
-            line = 5
-            request_type = tool_parameters.get("request_type", "")
-            if not request_type:
-                yield self.create_text_message("Please input request_type")
-
-            line = 6
-            model_id = tool_parameters.get("model_id", "")
-            if not model_id:
-                yield self.create_text_message("Please input model_id")
-
-            line = 7
-            dictionary_name = tool_parameters.get("dictionary_name", "")
-            if not dictionary_name:
-                yield self.create_text_message("Please input dictionary_name")
-
-            result = self._invoke_lambda(
-                text_content, src_lang, dest_lang, model_id, dictionary_name, request_type, lambda_name
+                self.lambda_client = get_cached_client("lambda", credentials)
+
+            src_contents = text_contents or [text_content]
+            result, parsed = self._invoke_lambda(
+                src_contents,
+                tool_parameters["src_lang"],
+                tool_parameters["dest_lang"],
+                tool_parameters["model_id"],
+                tool_parameters.get("dictionary_name", ""),
+                tool_parameters["request_type"],
+                tool_parameters["lambda_name"],
             )
 
+            if text_contents:
+                per_text_results = self._split_batch_results(src_contents, parsed)
+                if per_text_results is not None:
+                    yield self.create_json_message({"results": per_text_results})
+                elif parsed is not None:
+                    yield self.create_json_message(parsed if isinstance(parsed, dict) else {"result": parsed})
+
             yield self.create_text_message(text=result)
 
         except Exception as e:
+            line = e.__traceback__.tb_lineno if e.__traceback__ else None
             yield self.create_text_message(f"Exception {str(e)}, line : {line}")
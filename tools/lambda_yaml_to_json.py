@@ -4,18 +4,17 @@
 目的: Workflow から YAML テキストを渡し、サーバーレスに検証・変換した結果を取得できるようにする。
 """
 
-import json
 import logging
 from typing import Any, Union
 from collections.abc import Generator
 
-import boto3  # type: ignore
-
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from provider.utils import (
+    dumps_json_bytes,
+    get_cached_client,
+    loads_json,
     resolve_aws_credentials,
-    build_boto3_client_kwargs,
     reset_clients_on_credential_change,
 )
 
@@ -31,19 +30,22 @@ class LambdaYamlToJsonTool(Tool):
 
     def _invoke_lambda(self, lambda_name: str, yaml_content: str) -> str:
         msg = {"body": yaml_content}
-        logger.info(json.dumps(msg))
+        # 本文はログに出さずサイズのみ記録する (シリアライズの重複とログ肥大化を避ける)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("payload bytes=%d", len(yaml_content))
 
         invoke_response = self.lambda_client.invoke(
-            FunctionName=lambda_name, InvocationType="RequestResponse", Payload=json.dumps(msg)
+            FunctionName=lambda_name, InvocationType="RequestResponse", Payload=dumps_json_bytes(msg)
         )
         response_body = invoke_response["Payload"]
 
-        response_str = response_body.read().decode("utf-8")
-        resp_json = json.loads(response_str)
+        response_bytes = response_body.read()
+        resp_json = loads_json(response_bytes)
 
-        logger.info(resp_json)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("response bytes=%d", len(response_bytes))
         if resp_json["statusCode"] != 200:
-            raise Exception(f"Invalid status code: {response_str}")
+            raise Exception(f"Invalid status code: {response_bytes.decode('utf-8')}")
 
         return resp_json["body"]
 
@@ -53,16 +55,6 @@ class LambdaYamlToJsonTool(Tool):
     ) -> Generator[ToolInvokeMessage]:
         """YAML と Lambda 情報を検証し、変換結果をテキストで返す."""
         try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters.get("aws_region")
-
-            reset_clients_on_credential_change(self, credentials, ["lambda_client"])
-
-            if not self.lambda_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                self.lambda_client = boto3.client("lambda", **client_kwargs)
-
             yaml_content = tool_parameters.get("yaml_content", "")
             if not yaml_content:
                 return self.create_text_message("Please input yaml_content")
@@ -70,7 +62,16 @@ class LambdaYamlToJsonTool(Tool):
             lambda_name = tool_parameters.get("lambda_name", "")
             if not lambda_name:
                 return self.create_text_message("Please input lambda_name")
-            logger.debug(f"{json.dumps(tool_parameters, indent=2, ensure_ascii=False)}")
+
+            # 入力検証を通過した呼び出しだけが認証情報の解決とクライアント準備を行う
+            credentials = resolve_aws_credentials(self, tool_parameters)
+            if tool_parameters.get("aws_region"):
+                credentials["aws_region"] = tool_parameters.get("aws_region")
+
+            reset_clients_on_credential_change(self, credentials, ["lambda_client"])
+
+            if not self.lambda_client:
+                self.lambda_client = get_cached_client("lambda", credentials)
 
             result = self._invoke_lambda(lambda_name, yaml_content)
             logger.debug(result)
@@ -13,8 +13,6 @@ from typing import Any, Union
 from urllib.parse import urlparse
 from collections.abc import Generator
 
-import boto3
-
 from dify_plugin import Tool
 from dify_plugin.entities.tool import (
     ToolInvokeMessage,
@@ -22,7 +20,7 @@ from dify_plugin.entities.tool import (
     ToolParameterOption,
     I18nObject,
 )
-from provider.utils import resolve_aws_credentials, build_boto3_client_kwargs
+from provider.utils import get_cached_client, resolve_aws_credentials
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -57,7 +55,6 @@ class NovaCanvasTool(Tool):
         credentials = resolve_aws_credentials(self, tool_parameters)
         if aws_region:
             credentials["aws_region"] = aws_region
-        client_kwargs = build_boto3_client_kwargs(credentials)
 
         # 入力画像がある場合は S3 から取得し Base64 へエンコード
         image_input_s3uri = tool_parameters.get("image_input_s3uri", "")
@@ -71,7 +68,7 @@ class NovaCanvasTool(Tool):
             key = parsed_uri.path.lstrip("/")
 
             # Initialize S3 client and download image
-            s3_client = boto3.client("s3", **client_kwargs)
+            s3_client = get_cached_client("s3", credentials)
             response = s3_client.get_object(Bucket=bucket, Key=key)
             image_data = response["Body"].read()
 
@@ -80,7 +77,7 @@ class NovaCanvasTool(Tool):
 
         try:
             # Bedrock クライアントを初期化
-            bedrock = boto3.client(service_name="bedrock-runtime", **client_kwargs)
+            bedrock = get_cached_client("bedrock-runtime", credentials)
 
             # Nova Canvas の基本設定
             image_generation_config = {
@@ -162,7 +159,7 @@ class NovaCanvasTool(Tool):
 
             # Nova Canvas モデルを呼び出し
             response = bedrock.invoke_model(
-                body=json.dumps(body),
+                body=json.dumps(body, separators=(",", ":")),
                 modelId="amazon.nova-canvas-v1:0",
                 accept="application/json",
                 contentType="application/json",
@@ -185,7 +182,7 @@ class NovaCanvasTool(Tool):
                 output_key = f"{output_base_path}/canvas-output-{timestamp}.png"
 
                 # S3 へ PNG をアップロード
-                s3_client = boto3.client("s3", **client_kwargs)
+                s3_client = get_cached_client("s3", credentials)
 
                 # Decode base64 image and upload to S3
                 image_data = base64.b64decode(base64_image)
@@ -4,15 +4,15 @@
 目的: Dify のワークフローから非同期/同期モードで動画生成を実行し、S3 へ成果物を保存する。
 """
 
-import base64
 import logging
+import random
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
 from typing import Any, Optional, Union
-from urllib.parse import urlparse
 from collections.abc import Generator
 
-import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from PIL import Image
 
@@ -23,7 +23,12 @@ from dify_plugin.entities.tool import (
     ToolParameterOption,
     I18nObject,
 )
-from provider.utils import resolve_aws_credentials, build_boto3_client_kwargs
+from provider.utils import get_cached_client, resolve_aws_credentials
+
+try:
+    import pybase64 as base64  # type: ignore
+except ImportError:  # pragma: no cover - pybase64 は任意依存
+    import base64
 
 
 logging.basicConfig(level=logging.INFO)
@@ -34,12 +39,38 @@ NOVA_REEL_DEFAULT_DIMENSION = "1280x720"
 NOVA_REEL_DEFAULT_FPS = 24
 NOVA_REEL_DEFAULT_DURATION = 6
 NOVA_REEL_MODEL_ID = "amazon.nova-reel-v1:0"
-NOVA_REEL_STATUS_CHECK_INTERVAL = 5
+# 同期モードのポーリング間隔 (秒)。InProgress のたびに倍率を掛けて上限まで伸ばす
+NOVA_REEL_STATUS_CHECK_INITIAL_INTERVAL = 2.0
+NOVA_REEL_STATUS_CHECK_MAX_INTERVAL = 30.0
+NOVA_REEL_STATUS_CHECK_BACKOFF = 1.5
+
+# 生成動画のダウンロード設定。8 MiB を超える動画は Range GET を並列に発行して取得する
+NOVA_REEL_VIDEO_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True,
+)
+
+# ポーリング中に S3 への接続を温めておくためのバックグラウンド実行器
+_S3_WARMUP_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="nova-reel-s3-warmup")
 
 # 入力画像の要件（解像度と色空間）
 NOVA_REEL_REQUIRED_IMAGE_WIDTH = 1280
 NOVA_REEL_REQUIRED_IMAGE_HEIGHT = 720
 NOVA_REEL_REQUIRED_IMAGE_MODE = "RGB"
+# PNG の IHDR チャンク内でビット深度が置かれる位置 (シグネチャ 8 + 長さ 4 + 種別 4 + 幅 4 + 高さ 4)
+PNG_IHDR_BIT_DEPTH_OFFSET = 24
+# リサイズ時の事前間引きの閾値 (縮小率がこの値以上なら先に整数倍で縮小する)
+NOVA_REEL_RESIZE_REDUCING_GAP = 3.0
+# モデルへ渡す先頭フレームの JPEG 品質。PNG より大幅に小さく、エンコードも速い
+NOVA_REEL_INPUT_IMAGE_JPEG_QUALITY = 92
+
+
+def _split_s3_uri(s3_uri: str) -> tuple[str, str]:
+    """s3://bucket/key を (bucket, key) に分割する (urlparse を使わない軽量版)."""
+    bucket, _, key = s3_uri.partition("://")[2].partition("/")
+    return bucket, key.lstrip("/")
 
 
 class NovaReelTool(Tool):
@@ -48,13 +79,13 @@ class NovaReelTool(Tool):
     ) -> Generator[ToolInvokeMessage]:
         """AWS Bedrock Nova Reel モデルを呼び出して動画生成またはステータス情報を返す."""
         try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-
-            # 入力値を検証しつつ整形
+            # 入力値を検証しつつ整形 (不正な入力では認証情報やクライアントに触れずに終了)
             params = self._validate_and_extract_parameters(tool_parameters)
             if isinstance(params, ToolInvokeMessage):
                 yield params
+                return
 
+            credentials = resolve_aws_credentials(self, tool_parameters)
             if params["aws_region"]:
                 credentials["aws_region"] = params["aws_region"]
 
@@ -65,6 +96,7 @@ class NovaReelTool(Tool):
             model_input = self._prepare_model_input(params, s3_client)
             if isinstance(model_input, ToolInvokeMessage):
                 yield model_input
+                return
 
             # 動画生成を開始
             invocation = self._start_video_generation(bedrock, model_input, params["video_output_s3uri"])
@@ -115,10 +147,9 @@ class NovaReelTool(Tool):
         }
 
     def _initialize_aws_clients(self, credentials: dict[str, Optional[str]]) -> tuple[Any, Any]:
-        """Bedrock Runtime と S3 クライアントを生成する."""
-        client_kwargs = build_boto3_client_kwargs(credentials)
-        bedrock = boto3.client(service_name="bedrock-runtime", **client_kwargs)
-        s3_client = boto3.client("s3", **client_kwargs)
+        """Bedrock Runtime と S3 クライアントを取得する (資格情報ごとにプロセス全体で共有)."""
+        bedrock = get_cached_client("bedrock-runtime", credentials)
+        s3_client = get_cached_client("s3", credentials)
         return bedrock, s3_client
 
     def _prepare_model_input(self, params: dict[str, Any], s3_client: Any) -> Union[dict[str, Any], ToolInvokeMessage]:
@@ -141,19 +172,31 @@ class NovaReelTool(Tool):
                 if not image_data:
                     return self.create_text_message("Failed to retrieve image from S3")
 
-                # 前処理済み画像オブジェクトを取得し検証
-                processed_image = self._process_and_validate_image(image_data)
-                if isinstance(processed_image, ToolInvokeMessage):
-                    return processed_image
-
-                # PNG へ変換した画像を Base64 エンコード
-                img_buffer = BytesIO()
-                processed_image.save(img_buffer, format="PNG")
-                img_buffer.seek(0)
-                input_image_base64 = base64.b64encode(img_buffer.getvalue()).decode("utf-8")
+                # 要件を満たす画像はデコード・再エンコードせず元のバイト列をそのまま使う
+                image_format = self._get_passthrough_image_format(image_data)
+                if image_format:
+                    encoded_image = image_data
+                else:
+                    # 前処理済み画像オブジェクトを取得し検証
+                    processed_image = self._process_and_validate_image(image_data)
+                    if isinstance(processed_image, ToolInvokeMessage):
+                        return processed_image
+
+                    # JPEG へ変換
+                    img_buffer = BytesIO()
+                    processed_image.save(
+                        img_buffer,
+                        format="JPEG",
+                        quality=NOVA_REEL_INPUT_IMAGE_JPEG_QUALITY,
+                        optimize=False,
+                        progressive=False,
+                    )
+                    image_format = "jpeg"
+                    encoded_image = img_buffer.getvalue()
 
+                input_image_base64 = base64.b64encode(encoded_image).decode("utf-8")
                 model_input["textToVideoParams"]["images"] = [
-                    {"format": "png", "source": {"bytes": input_image_base64}}
+                    {"format": image_format, "source": {"bytes": input_image_base64}}
                 ]
             except Exception as e:
                 logger.error(f"Error processing input image: {str(e)}", exc_info=True)
@@ -161,16 +204,38 @@ class NovaReelTool(Tool):
 
         return model_input
 
+    @staticmethod
+    def _get_passthrough_image_format(image_data: bytes) -> Optional[str]:
+        """ヘッダーだけを読み、そのまま送れる 1280x720 8 bit RGB の JPEG/PNG なら "jpeg"/"png" を返す."""
+        try:
+            img = Image.open(BytesIO(image_data))
+        except Exception:
+            return None
+        if (
+            img.format in ("JPEG", "PNG")
+            and img.size == (NOVA_REEL_REQUIRED_IMAGE_WIDTH, NOVA_REEL_REQUIRED_IMAGE_HEIGHT)
+            and img.mode == NOVA_REEL_REQUIRED_IMAGE_MODE
+            and "transparency" not in img.info
+            # 16 bit/チャネルの PNG も mode は "RGB" で開かれるため、IHDR のビット深度が 8 のものだけを通す
+            and (img.format != "PNG" or image_data[PNG_IHDR_BIT_DEPTH_OFFSET] == 8)
+        ):
+            return img.format.lower()
+        return None
+
     def _process_and_validate_image(self, image_data: bytes) -> Union[Image.Image, ToolInvokeMessage]:
         """Nova Reel が要求する 1280x720 RGB 画像へ正規化し、条件を満たさない場合はメッセージを返す."""
         try:
             # 画像を開く
             img = Image.open(BytesIO(image_data))
+            original_size = img.size
+
+            # JPEG はデコード時に DCT スケーリングで縮小・RGB 化して読み込む (他形式では何もしない)
+            img.draft(NOVA_REEL_REQUIRED_IMAGE_MODE, (NOVA_REEL_REQUIRED_IMAGE_WIDTH, NOVA_REEL_REQUIRED_IMAGE_HEIGHT))
 
             # RGBA の場合は透過有無をチェックし、必要なら RGB へ変換
             if img.mode == "RGBA":
-                # 透過ピクセルが存在しないか確認
-                if img.getchannel("A").getextrema()[0] < 255:
+                # 透過ピクセルが存在しないか確認 (アルファチャネルを別画像として切り出さずに全バンドを一度に走査)
+                if img.getextrema()[3][0] < 255:
                     return self.create_text_message(
                         "PNG image contains transparent or translucent pixels, which is not supported. "
                         "Please provide an image without transparency."
@@ -184,11 +249,14 @@ class NovaReelTool(Tool):
             # 解像度が違えばリサイズ
             if img.size != (NOVA_REEL_REQUIRED_IMAGE_WIDTH, NOVA_REEL_REQUIRED_IMAGE_HEIGHT):
                 logger.warning(
-                    f"Image dimensions {img.size} do not match required dimensions "
+                    f"Image dimensions {original_size} do not match required dimensions "
                     f"({NOVA_REEL_REQUIRED_IMAGE_WIDTH}x{NOVA_REEL_REQUIRED_IMAGE_HEIGHT}). Resizing..."
                 )
+                # 大きな画像は reduce() で整数倍に間引いてから BICUBIC で仕上げる
                 img = img.resize(
-                    (NOVA_REEL_REQUIRED_IMAGE_WIDTH, NOVA_REEL_REQUIRED_IMAGE_HEIGHT), Image.Resampling.LANCZOS
+                    (NOVA_REEL_REQUIRED_IMAGE_WIDTH, NOVA_REEL_REQUIRED_IMAGE_HEIGHT),
+                    Image.Resampling.BICUBIC,
+                    reducing_gap=NOVA_REEL_RESIZE_REDUCING_GAP,
                 )
 
             # ビット深度を確認
@@ -207,9 +275,7 @@ class NovaReelTool(Tool):
 
     def _get_image_from_s3(self, s3_client: Any, s3_uri: str) -> Optional[bytes]:
         """S3 から画像バイナリを取得する."""
-        parsed_uri = urlparse(s3_uri)
-        bucket = parsed_uri.netloc
-        key = parsed_uri.path.lstrip("/")
+        bucket, key = _split_s3_uri(s3_uri)
 
         response = s3_client.get_object(Bucket=bucket, Key=key)
         return response["Body"].read()
@@ -239,6 +305,8 @@ class NovaReelTool(Tool):
 
     def _wait_for_completion(self, bedrock: Any, s3_client: Any, invocation_arn: str) -> ToolInvokeMessage:
         """同期モードで生成完了をポーリングし、成功/失敗を判定する."""
+        delay = NOVA_REEL_STATUS_CHECK_INITIAL_INTERVAL
+        warmup: Optional[Future] = None
         while True:
             status_response = bedrock.get_async_invoke(invocationArn=invocation_arn)
             status = status_response["status"]
@@ -250,19 +318,34 @@ class NovaReelTool(Tool):
                 failure_message = status_response.get("failureMessage", "Unknown error")
                 return self.create_text_message(f"Video generation failed.\nError: {failure_message}")
             elif status == "InProgress":
-                time.sleep(NOVA_REEL_STATUS_CHECK_INTERVAL)
+                # 待機中に HEAD を投げて DNS/TLS 接続をプールに用意し、完了後のダウンロード開始を速める
+                if warmup is None or warmup.done():
+                    warmup = _S3_WARMUP_EXECUTOR.submit(self._warm_up_s3_connection, s3_client, video_path)
+                # 指数バックオフ + ジッターで、長い生成ほどポーリング回数を減らし同時実行時の集中も避ける
+                time.sleep(delay + random.uniform(0, delay * 0.1))
+                delay = min(delay * NOVA_REEL_STATUS_CHECK_BACKOFF, NOVA_REEL_STATUS_CHECK_MAX_INTERVAL)
             else:
                 return self.create_text_message(f"Unexpected status: {status}")
 
+    @staticmethod
+    def _warm_up_s3_connection(s3_client: Any, video_path: str) -> None:
+        """出力先オブジェクトへ HEAD を発行する。生成前の 404 などは無視する."""
+        bucket, key = _split_s3_uri(video_path)
+        try:
+            s3_client.head_object(Bucket=bucket, Key=f"{key}/output.mp4")
+        except Exception:
+            pass
+
     def _handle_completed_video(self, s3_client: Any, video_path: str) -> ToolInvokeMessage:
         """生成済み動画をダウンロードし、テキスト通知とバイナリを返す."""
-        parsed_uri = urlparse(video_path)
-        bucket = parsed_uri.netloc
-        key = parsed_uri.path.lstrip("/") + "/output.mp4"
+        bucket, key = _split_s3_uri(video_path)
+        key += "/output.mp4"
 
         try:
-            response = s3_client.get_object(Bucket=bucket, Key=key)
-            video_content = response["Body"].read()
+            video_buffer = BytesIO()
+            s3_client.download_fileobj(bucket, key, video_buffer, Config=NOVA_REEL_VIDEO_TRANSFER_CONFIG)
+            video_content = video_buffer.getvalue()
+            video_buffer.close()
             return [
                 self.create_text_message(f"Video is available at: {video_path}/output.mp4"),
                 self.create_blob_message(blob=video_content, meta={"mime_type": "video/mp4"}, save_as="output.mp4"),
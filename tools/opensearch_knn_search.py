@@ -66,7 +66,7 @@ class OpenSearchRetrieveTool(Tool):
                  "outputEmbeddingLength": dimension
             }
         }
-        body = json.dumps({**request_body, **embedding_config})
+        body = json.dumps({**request_body, **embedding_config}, separators=(",", ":"))
         response = self.bedrock_client.invoke_model(
             body=body,
             modelId=model_id,
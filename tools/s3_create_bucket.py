@@ -9,23 +9,18 @@ from __future__ import annotations
 from collections.abc import Generator
 from typing import Any
 
-import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
 try:  # pragma: no cover - import path differs when packaged
     from my_aws_tools.provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        ensure_client,
     )
 except ModuleNotFoundError:  # pragma: no cover
     from provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        ensure_client,
     )
 
 
@@ -35,26 +30,21 @@ class S3CreateBucket(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
         """S3 バケットを作成し、作成結果のサマリを返す。"""
 
-        try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters["aws_region"]
-
-            reset_clients_on_credential_change(self, credentials, ["s3_client"])
-            if not self.s3_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                self.s3_client = boto3.client("s3", **client_kwargs)
-        except Exception as exc:  # pragma: no cover - boto3 init errors
-            yield self.create_text_message(f"Failed to initialize AWS client: {exc}")
-            return
+        get = tool_parameters.get
 
-        bucket_name = (tool_parameters.get("bucket_name") or "").strip()
-        if not bucket_name:
+        # 必須パラメータが欠けていればクライアントを準備せずに終了する
+        if not (bucket_name := (get("bucket_name") or "").strip()):
             yield self.create_text_message("bucket_name parameter is required")
             return
 
+        try:
+            self.s3_client, credentials = ensure_client(self, tool_parameters, "s3", "s3_client")
+        except (BotoCoreError, ValueError) as exc:  # pragma: no cover - boto3 init errors
+            yield self.create_text_message(f"Failed to initialize AWS client: {exc}")
+            return
+
         region = credentials.get("aws_region") or "us-east-1"
-        acl = (tool_parameters.get("acl") or "").strip()
+        acl = (get("acl") or "").strip()
 
         create_kwargs: dict[str, Any] = {"Bucket": bucket_name}
         if acl:
@@ -69,7 +59,7 @@ class S3CreateBucket(Tool):
             error_message = exc.response.get("Error", {}).get("Message", str(exc))
             yield self.create_text_message(f"Failed to create bucket: {error_message}")
             return
-        except Exception as exc:  # pragma: no cover - unexpected errors
+        except BotoCoreError as exc:  # pragma: no cover - connection / transport errors
             yield self.create_text_message(f"Failed to create bucket: {exc}")
             return
 
@@ -7,54 +7,148 @@
 from __future__ import annotations
 
 from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
-from urllib.parse import urlparse
 
-import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError, IncompleteReadError
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
 try:
     from my_aws_tools.provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        ensure_client,
     )
 except ModuleNotFoundError:  # pragma: no cover
     from provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        ensure_client,
     )
 
+# StreamingBody から一度に読み出すチャンクサイズ
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+# これを超えるオブジェクトは Range GET を並列に発行して取得する (MiB)
+DEFAULT_MULTIPART_THRESHOLD_MB = 16
+DEFAULT_PART_SIZE_MB = 8
+DOWNLOAD_MAX_CONCURRENCY = 8
+_DOWNLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=DOWNLOAD_MAX_CONCURRENCY, thread_name_prefix="s3-download")
+
+
+def _read_body_into(body: Any, view: memoryview) -> int:
+    """StreamingBody をチャンク単位で読み、view の先頭から詰めて書き込んだバイト数を返す。view を超える場合はエラーにする。"""
+    offset = 0
+    for chunk in body.iter_chunks(DOWNLOAD_CHUNK_SIZE):
+        end = offset + len(chunk)
+        if end > len(view):
+            # 想定より長い本文は memoryview への代入で ValueError になる前に打ち切る
+            raise IncompleteReadError(actual_bytes=end, expected_bytes=len(view))
+        view[offset:end] = chunk
+        offset = end
+    return offset
+
+
+def _read_exact(body: Any, view: memoryview) -> None:
+    """view をちょうど埋めるまで読み込み、過不足があればエラーにする。"""
+    received = _read_body_into(body, view)
+    if received != len(view):
+        raise IncompleteReadError(actual_bytes=received, expected_bytes=len(view))
+
+
+def _read_object_body(response: dict[str, Any]) -> bytes:
+    """ContentLength 分を確保したバッファへ本文を直接読み込む。長さが不明な場合は read() に任せる。"""
+    content_length = response.get("ContentLength")
+    if content_length is None:
+        return response["Body"].read()
+
+    buffer = bytearray(content_length)
+    with memoryview(buffer) as view:
+        _read_exact(response["Body"], view)
+    return bytes(buffer)
+
+
+def _total_object_size(response: dict[str, Any]) -> int:
+    """Range GET のレスポンスから Content-Range (bytes a-b/total) を読み、オブジェクト全体のサイズを返す。"""
+    content_range = response.get("ContentRange") or ""
+    total = content_range.rpartition("/")[2]
+    return int(total) if total.isdigit() else response["ContentLength"]
+
+
+def _parse_size_mb(value: Any, default: int) -> int:
+    """MiB 単位のパラメータをバイト数へ変換する。不正値や 1 未満は既定値を使う。"""
+    try:
+        size_mb = int(value)
+    except (TypeError, ValueError):
+        size_mb = default
+    if size_mb < 1:
+        size_mb = default
+    return size_mb * 1024 * 1024
+
 
 def _build_metadata_text(metadata: dict[str, Any]) -> str:
-    """シンプルなキー=値形式のテキストへ整形する。"""
-    lines = []
-    for key, value in metadata.items():
-        if value is None:
-            continue
-        lines.append(f"{key}: {value}")
-    return "\n".join(lines)
+    """シンプルなキー=値形式のテキストへ整形する。
+
+    bucket / key / content_type / s3_uri は常に値を持つため、任意項目だけを条件付きで連結する。
+    """
+    content_length = metadata.get("content_length")
+    etag = metadata.get("etag")
+    last_modified = metadata.get("last_modified")
+    return (
+        f"bucket: {metadata['bucket']}\nkey: {metadata['key']}\ncontent_type: {metadata['content_type']}"
+        + (f"\ncontent_length: {content_length}" if content_length is not None else "")
+        + (f"\netag: {etag}" if etag is not None else "")
+        + (f"\nlast_modified: {last_modified}" if last_modified is not None else "")
+        + f"\ns3_uri: {metadata['s3_uri']}"
+    )
 
 
 class S3FileDownload(Tool):
     s3_client: Any = None
 
+    def _download_object(
+        self, bucket: str, key: str, multipart_threshold: int, part_size: int
+    ) -> tuple[dict[str, Any], bytes]:
+        """先頭を Range GET で取得し、閾値を超える大きなオブジェクトだけ残りを並列 Range GET で取得する。
+
+        追加の HEAD は行わず、先頭リクエストの Content-Range から全体サイズを知る。
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{multipart_threshold - 1}")
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") != "InvalidRange":
+                raise
+            # 空オブジェクトには Range を指定できないため通常の GET で取得する
+            response = self.s3_client.get_object(Bucket=bucket, Key=key)
+            return response, _read_object_body(response)
+
+        total_size = _total_object_size(response)
+        first_size = response["ContentLength"]
+        if first_size >= total_size:
+            return response, _read_object_body(response)
+
+        buffer = bytearray(total_size)
+        with memoryview(buffer) as view:
+            _read_exact(response["Body"], view[:first_size])
+
+            # 取得中にオブジェクトが差し替えられた場合に備え、各パートは同じ ETag に限定する
+            etag = response.get("ETag")
+
+            def fetch_part(start: int) -> None:
+                end = min(start + part_size, total_size)
+                part_kwargs: dict[str, Any] = {"Bucket": bucket, "Key": key, "Range": f"bytes={start}-{end - 1}"}
+                if etag:
+                    part_kwargs["IfMatch"] = etag
+                part = self.s3_client.get_object(**part_kwargs)
+                _read_exact(part["Body"], view[start:end])
+
+            list(_DOWNLOAD_EXECUTOR.map(fetch_part, range(first_size, total_size, part_size)))
+
+        response["ContentLength"] = total_size
+        return response, bytes(buffer)
+
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
         """S3 からファイルを取得し、バイナリとメタデータ（JSON/テキスト）を返す。"""
         try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters["aws_region"]
-
-            reset_clients_on_credential_change(self, credentials, ["s3_client"])
-            if not self.s3_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                self.s3_client = boto3.client("s3", **client_kwargs)
-        except Exception as exc:
+            self.s3_client, _ = ensure_client(self, tool_parameters, "s3", "s3_client")
+        except (BotoCoreError, ValueError) as exc:
             yield self.create_text_message(f"Failed to initialize AWS client: {exc}")
             return
 
@@ -63,17 +157,22 @@ class S3FileDownload(Tool):
             yield self.create_text_message("s3_uri parameter is required")
             return
 
-        parsed_uri = urlparse(s3_uri)
-        if parsed_uri.scheme != "s3" or not parsed_uri.netloc or not parsed_uri.path:
+        # s3://bucket/key 以外の要素は扱わないため urlparse ではなく partition で分割する
+        if not s3_uri.startswith("s3://"):
+            yield self.create_text_message("Invalid S3 URI format. Use s3://bucket/key")
+            return
+        bucket, _, key = s3_uri[5:].partition("/")
+        if not bucket or not key:
             yield self.create_text_message("Invalid S3 URI format. Use s3://bucket/key")
             return
-
-        bucket = parsed_uri.netloc
-        key = parsed_uri.path.lstrip("/")
 
         try:
-            response = self.s3_client.get_object(Bucket=bucket, Key=key)
-            file_bytes = response["Body"].read()
+            response, file_bytes = self._download_object(
+                bucket,
+                key,
+                _parse_size_mb(tool_parameters.get("multipart_threshold"), DEFAULT_MULTIPART_THRESHOLD_MB),
+                _parse_size_mb(tool_parameters.get("part_size"), DEFAULT_PART_SIZE_MB),
+            )
         except self.s3_client.exceptions.NoSuchBucket:
             yield self.create_text_message(f"Bucket '{bucket}' does not exist")
             return
@@ -84,7 +183,7 @@ class S3FileDownload(Tool):
             error_message = exc.response.get("Error", {}).get("Message", str(exc))
             yield self.create_text_message(f"Failed to download S3 object: {error_message}")
             return
-        except Exception as exc:
+        except BotoCoreError as exc:
             yield self.create_text_message(f"Failed to download S3 object: {exc}")
             return
 
@@ -111,4 +210,4 @@ class S3FileDownload(Tool):
         yield self.create_blob_message(file_bytes, meta=blob_meta)
 
         yield self.create_json_message(metadata_dict)
-        yield self.create_text_message(metadata_text or f"bucket: {bucket}\nkey: {key}")
+        yield self.create_text_message(metadata_text)
@@ -6,27 +6,57 @@
 
 from __future__ import annotations
 
-import uuid
+import secrets
 from collections.abc import Generator
+from io import BytesIO
 from typing import Any
 
-import boto3
-from botocore.exceptions import ClientError
+import requests
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import BotoCoreError, ClientError
+from requests.exceptions import RequestException
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
 try:
     from my_aws_tools.provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        ensure_client,
     )
 except ModuleNotFoundError:  # pragma: no cover
     from provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        ensure_client,
+    )
+
+# これ以上のサイズは TransferConfig によるマルチパートの並列アップロードに切り替える
+UPLOAD_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+UPLOAD_MAX_CONCURRENCY = 10
+DEFAULT_UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=UPLOAD_MULTIPART_THRESHOLD,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=UPLOAD_MAX_CONCURRENCY,
+    use_threads=True,
+)
+# ファイル URL からのストリーミング取得に使う共有 HTTP セッション
+_HTTP_SESSION = requests.Session()
+FILE_DOWNLOAD_TIMEOUT = 30
+
+
+def _build_transfer_config(chunksize_mb: Any) -> TransferConfig:
+    """multipart_chunksize (MiB) が指定されていればそれを使った TransferConfig を返す。"""
+    try:
+        chunksize = int(chunksize_mb) * 1024 * 1024
+    except (TypeError, ValueError):
+        return DEFAULT_UPLOAD_TRANSFER_CONFIG
+    # S3 のマルチパートは最終パート以外 5 MiB 以上が必要
+    if chunksize < 5 * 1024 * 1024:
+        return DEFAULT_UPLOAD_TRANSFER_CONFIG
+    return TransferConfig(
+        multipart_threshold=UPLOAD_MULTIPART_THRESHOLD,
+        multipart_chunksize=chunksize,
+        max_concurrency=UPLOAD_MAX_CONCURRENCY,
+        use_threads=True,
     )
 
 
@@ -43,15 +73,8 @@ class S3FileUploader(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
         """ファイルを取得し、S3 へアップロードした結果を JSON で返す。"""
         try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters["aws_region"]
-
-            reset_clients_on_credential_change(self, credentials, ["s3_client"])
-            if not self.s3_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                self.s3_client = boto3.client("s3", **client_kwargs)
-        except Exception as exc:
+            self.s3_client, _ = ensure_client(self, tool_parameters, "s3", "s3_client")
+        except (BotoCoreError, ValueError) as exc:
             yield self.create_text_message(f"Failed to initialize AWS client: {exc}")
             return
 
@@ -60,38 +83,77 @@ class S3FileUploader(Tool):
             yield self.create_text_message("input_file parameter is required")
             return
 
-        try:
-            file_bytes: bytes = input_file.blob  # type: ignore[attr-defined]
-        except Exception as exc:
-            yield self.create_text_message(f"Failed to read input_file: {exc}")
-            return
-
         bucket_name = tool_parameters.get("bucket_name")
         if not bucket_name:
             yield self.create_text_message("bucket_name parameter is required")
             return
 
+        file_url = getattr(input_file, "url", None)
         key_prefix = _sanitize_prefix(tool_parameters.get("key_prefix"))
-        requested_key = tool_parameters.get("object_key") or getattr(input_file, "filename", None)
-        fallback_key = getattr(input_file, "url", "").rstrip("/").split("/")[-1] if getattr(input_file, "url", None) else None
-        object_key = requested_key or fallback_key or f"dify-upload-{uuid.uuid4().hex}"
+        object_key = tool_parameters.get("object_key") or getattr(input_file, "filename", None)
+        if not object_key:
+            # キーもファイル名も無いときだけ URL の末尾セグメントを使う
+            object_key = (file_url or "").rstrip("/").rpartition("/")[2] or f"dify-upload-{secrets.token_hex(16)}"
         object_key = object_key.lstrip("/")
         if key_prefix:
             object_key = f"{key_prefix}/{object_key}"
 
         content_type = getattr(input_file, "mime_type", None) or "application/octet-stream"
 
+        # サイズが閾値以上 (または不明) で URL から取得できるファイルは、blob として全体を
+        # メモリへ載せずにレスポンスをそのまま upload_fileobj へ流し込む
+        file_size = getattr(input_file, "size", None)
+        stream_upload = bool(file_url) and (
+            not isinstance(file_size, int) or file_size < 0 or file_size >= UPLOAD_MULTIPART_THRESHOLD
+        )
+
+        file_bytes: bytes | None = None
+        if not stream_upload:
+            try:
+                file_bytes = input_file.blob  # type: ignore[attr-defined]
+            except Exception as exc:
+                yield self.create_text_message(f"Failed to read input_file: {exc}")
+                return
+
         try:
-            self.s3_client.put_object(
-                Bucket=bucket_name,
-                Key=object_key,
-                Body=file_bytes,
-                ContentType=content_type,
-            )
+            if file_bytes is None:
+                with _HTTP_SESSION.get(file_url, stream=True, timeout=FILE_DOWNLOAD_TIMEOUT) as response:
+                    response.raise_for_status()
+                    # Content-Encoding が付いていても展開後のバイト列をアップロードする
+                    response.raw.decode_content = True
+                    self.s3_client.upload_fileobj(
+                        response.raw,
+                        bucket_name,
+                        object_key,
+                        ExtraArgs={"ContentType": content_type},
+                        Config=_build_transfer_config(tool_parameters.get("multipart_chunksize")),
+                    )
+            elif len(file_bytes) < UPLOAD_MULTIPART_THRESHOLD:
+                self.s3_client.put_object(
+                    Bucket=bucket_name,
+                    Key=object_key,
+                    Body=file_bytes,
+                    ContentType=content_type,
+                )
+            else:
+                # 大きなファイルはパートに分けて並列にアップロードする
+                self.s3_client.upload_fileobj(
+                    BytesIO(file_bytes),
+                    bucket_name,
+                    object_key,
+                    ExtraArgs={"ContentType": content_type},
+                    Config=_build_transfer_config(tool_parameters.get("multipart_chunksize")),
+                )
+        except RequestException as exc:
+            yield self.create_text_message(f"Failed to read input_file: {exc}")
+            return
         except ClientError as exc:
             error_message = exc.response.get("Error", {}).get("Message", str(exc))
             yield self.create_text_message(f"Failed to upload file to S3: {error_message}")
             return
+        except (S3UploadFailedError, BotoCoreError) as exc:
+            yield self.create_text_message(f"Failed to upload file to S3: {exc}")
+            return
 
         s3_uri = f"s3://{bucket_name}/{object_key}"
         result_payload: dict[str, Any] = {
@@ -7,58 +7,55 @@
 from __future__ import annotations
 
 from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
-import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
 try:  # pragma: no cover - import path differs when packaged
     from my_aws_tools.provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        ensure_client,
     )
 except ModuleNotFoundError:  # pragma: no cover
     from provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        ensure_client,
     )
 
-
-def _to_iso8601(value: Any) -> str | None:
-    """datetime を ISO8601 文字列へ安全に変換する。"""
-
-    try:
-        return value.isoformat()
-    except AttributeError:
-        return None
+# get_bucket_location を並列に発行する際の同時実行数 (共有クライアントの接続プール上限より小さく保つ)
+BUCKET_LOCATION_MAX_CONCURRENCY = 16
+_BUCKET_LOCATION_EXECUTOR = ThreadPoolExecutor(
+    max_workers=BUCKET_LOCATION_MAX_CONCURRENCY, thread_name_prefix="s3-bucket-location"
+)
 
 
 class S3ListBuckets(Tool):
     s3_client: Any = None
 
+    @staticmethod
+    def _lookup_bucket_region(s3_client: Any, bucket_name: str) -> dict[str, str]:
+        """バケットのリージョン、または取得失敗時のエラーメッセージを返す。"""
+
+        try:
+            location_response = s3_client.get_bucket_location(Bucket=bucket_name)
+        except ClientError as exc:
+            return {"region_lookup_error": exc.response.get("Error", {}).get("Message", str(exc))}
+        return {"region": location_response.get("LocationConstraint") or "us-east-1"}
+
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
         """S3 バケット一覧を取得し、必要に応じてリージョン情報も付与する。"""
 
         try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters["aws_region"]
-
-            reset_clients_on_credential_change(self, credentials, ["s3_client"])
-            if not self.s3_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                self.s3_client = boto3.client("s3", **client_kwargs)
-        except Exception as exc:  # pragma: no cover - boto3 init errors
+            self.s3_client, _ = ensure_client(self, tool_parameters, "s3", "s3_client")
+        except (BotoCoreError, ValueError) as exc:  # pragma: no cover - boto3 init errors
             yield self.create_text_message(f"Failed to initialize AWS client: {exc}")
             return
 
-        include_region = bool(tool_parameters.get("include_region"))
-        name_prefix = (tool_parameters.get("name_prefix") or "").strip()
+        get = tool_parameters.get
+        include_region = bool(get("include_region"))
+        name_prefix = (get("name_prefix") or "").strip()
 
         try:
             response = self.s3_client.list_buckets()
@@ -66,33 +63,34 @@ class S3ListBuckets(Tool):
             error_message = exc.response.get("Error", {}).get("Message", str(exc))
             yield self.create_text_message(f"Failed to list buckets: {error_message}")
             return
-        except Exception as exc:  # pragma: no cover - unexpected errors
+        except BotoCoreError as exc:  # pragma: no cover - connection / transport errors
             yield self.create_text_message(f"Failed to list buckets: {exc}")
             return
 
-        buckets: list[dict[str, Any]] = []
-        for bucket in response.get("Buckets", []):
-            bucket_name = bucket.get("Name")
-            if not bucket_name:
-                continue
-            if name_prefix and not bucket_name.startswith(name_prefix):
-                continue
-
-            bucket_entry: dict[str, Any] = {
-                "name": bucket_name,
-                "creation_date": _to_iso8601(bucket.get("CreationDate")),
+        # プレフィックス有無の分岐はループの外で一度だけ決める (空のプレフィックスでは名前の有無のみ確認)
+        all_buckets = response.get("Buckets", ())
+        if name_prefix:
+            matched = (bucket for bucket in all_buckets if bucket.get("Name", "").startswith(name_prefix))
+        else:
+            matched = (bucket for bucket in all_buckets if bucket.get("Name"))
+        buckets: list[dict[str, Any]] = [
+            {
+                "name": bucket["Name"],
+                "creation_date": bucket["CreationDate"].isoformat() if "CreationDate" in bucket else None,
             }
-
-            if include_region:
-                try:
-                    location_response = self.s3_client.get_bucket_location(Bucket=bucket_name)
-                    constraint = location_response.get("LocationConstraint")
-                    bucket_entry["region"] = constraint or "us-east-1"
-                except ClientError as exc:
-                    error_message = exc.response.get("Error", {}).get("Message", str(exc))
-                    bucket_entry["region_lookup_error"] = error_message
-
-            buckets.append(bucket_entry)
+            for bucket in matched
+        ]
+
+        if include_region and buckets:
+            # バケットごとの往復を直列に待たず、共有クライアント上で並列に問い合わせる
+            s3_client = self.s3_client
+            for bucket_entry, region_info in zip(
+                buckets,
+                _BUCKET_LOCATION_EXECUTOR.map(
+                    lambda entry: self._lookup_bucket_region(s3_client, entry["name"]), buckets
+                ),
+            ):
+                bucket_entry.update(region_info)
 
         payload = {
             "bucket_count": len(buckets),
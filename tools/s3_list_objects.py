@@ -7,35 +7,46 @@
 from __future__ import annotations
 
 from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from typing import Any
 
-import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
 try:  # pragma: no cover - 発行パッケージから参照される場合のフォールバック
     from my_aws_tools.provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        ensure_client,
     )
 except ModuleNotFoundError:  # pragma: no cover
     from provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        ensure_client,
     )
 
+# all_pages モードの既定の取得上限と、サブプレフィックスを並列に走査する際の同時実行数
+DEFAULT_MAX_TOTAL_KEYS = 10000
+LIST_MAX_CONCURRENCY = 8
+_LIST_EXECUTOR = ThreadPoolExecutor(max_workers=LIST_MAX_CONCURRENCY, thread_name_prefix="s3-list-objects")
 
-def _to_iso8601(value: Any) -> str | None:
-    """datetime を ISO 8601 文字列に変換する安全なヘルパ。"""
 
-    try:
-        return value.isoformat()
-    except AttributeError:
-        return None
+def _to_object_entries(contents: list[dict[str, Any]] | None) -> list[dict[str, Any]]:
+    """list_objects_v2 の Contents をツール出力用の辞書リストへ一括変換する。
+
+    1 ページ最大 1000 件を処理するため、ヘルパ呼び出しを挟まず内包表記で組み立てる。
+    """
+
+    return [
+        {
+            "key": entry.get("Key"),
+            "size": entry.get("Size"),
+            "last_modified": entry["LastModified"].isoformat() if "LastModified" in entry else None,
+            "etag": entry.get("ETag"),
+            "storage_class": entry.get("StorageClass"),
+        }
+        for entry in contents or ()
+    ]
 
 
 class S3ListObjects(Tool):
@@ -44,28 +55,23 @@ class S3ListObjects(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
         """指定バケットのオブジェクトを一覧取得して返す。"""
 
-        try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters["aws_region"]
-
-            reset_clients_on_credential_change(self, credentials, ["s3_client"])
-            if not self.s3_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                self.s3_client = boto3.client("s3", **client_kwargs)
-        except Exception as exc:  # pragma: no cover - boto3 初期化エラー
-            yield self.create_text_message(f"Failed to initialize AWS client: {exc}")
-            return
+        get = tool_parameters.get
 
-        bucket_name = (tool_parameters.get("bucket_name") or "").strip()
-        if not bucket_name:
+        # 必須パラメータが欠けていればクライアントを準備せずに終了する
+        if not (bucket_name := (get("bucket_name") or "").strip()):
             yield self.create_text_message("bucket_name parameter is required")
             return
 
-        prefix = (tool_parameters.get("prefix") or "").strip()
-        continuation_token = (tool_parameters.get("continuation_token") or "").strip() or None
+        try:
+            self.s3_client, _ = ensure_client(self, tool_parameters, "s3", "s3_client")
+        except (BotoCoreError, ValueError) as exc:  # pragma: no cover - boto3 初期化エラー
+            yield self.create_text_message(f"Failed to initialize AWS client: {exc}")
+            return
 
-        max_keys_raw = tool_parameters.get("max_keys", 100)
+        prefix = (get("prefix") or "").strip()
+        continuation_token = (get("continuation_token") or "").strip() or None
+
+        max_keys_raw = get("max_keys", 100)
         try:
             max_keys = int(max_keys_raw)
         except (TypeError, ValueError):
@@ -73,6 +79,41 @@ class S3ListObjects(Tool):
             return
         max_keys = max(1, min(max_keys, 1000))  # API 制限: 1 <= MaxKeys <= 1000
 
+        if get("all_pages"):
+            max_total_raw = get("max_total_keys") or DEFAULT_MAX_TOTAL_KEYS
+            try:
+                max_total_keys = max(1, int(max_total_raw))
+            except (TypeError, ValueError):
+                yield self.create_text_message("max_total_keys must be an integer")
+                return
+
+            try:
+                entries, is_truncated = self._list_all_objects(bucket_name, prefix, max_total_keys)
+            except self.s3_client.exceptions.NoSuchBucket:
+                yield self.create_text_message(f"Bucket '{bucket_name}' does not exist")
+                return
+            except ClientError as exc:
+                error_message = exc.response.get("Error", {}).get("Message", str(exc))
+                yield self.create_text_message(f"Failed to list objects: {error_message}")
+                return
+            except BotoCoreError as exc:  # pragma: no cover - 通信エラーなど
+                yield self.create_text_message(f"Failed to list objects: {exc}")
+                return
+
+            objects = _to_object_entries(entries)
+            yield self.create_json_message(
+                {
+                    "bucket_name": bucket_name,
+                    "prefix": prefix or None,
+                    "max_total_keys": max_total_keys,
+                    "is_truncated": is_truncated,
+                    "object_count": len(objects),
+                    "objects": objects,
+                }
+            )
+            yield self.create_text_message(self._build_summary(bucket_name, objects))
+            return
+
         request_kwargs: dict[str, Any] = {"Bucket": bucket_name, "MaxKeys": max_keys}
         if prefix:
             request_kwargs["Prefix"] = prefix
@@ -88,21 +129,11 @@ class S3ListObjects(Tool):
             error_message = exc.response.get("Error", {}).get("Message", str(exc))
             yield self.create_text_message(f"Failed to list objects: {error_message}")
             return
-        except Exception as exc:  # pragma: no cover - 想定外エラー
+        except BotoCoreError as exc:  # pragma: no cover - 通信エラーなど
             yield self.create_text_message(f"Failed to list objects: {exc}")
             return
 
-        objects: list[dict[str, Any]] = []
-        for entry in response.get("Contents", []) or []:
-            objects.append(
-                {
-                    "key": entry.get("Key"),
-                    "size": entry.get("Size"),
-                    "last_modified": _to_iso8601(entry.get("LastModified")),
-                    "etag": entry.get("ETag"),
-                    "storage_class": entry.get("StorageClass"),
-                }
-            )
+        objects = _to_object_entries(response.get("Contents"))
 
         payload = {
             "bucket_name": bucket_name,
@@ -116,10 +147,66 @@ class S3ListObjects(Tool):
         }
 
         yield self.create_json_message(payload)
+        yield self.create_text_message(self._build_summary(bucket_name, objects))
+
+    @staticmethod
+    def _build_summary(bucket_name: str, objects: list[dict[str, Any]]) -> str:
+        """一覧結果の件数とキーのサンプルをテキストにまとめる。"""
 
         if not objects:
-            summary = f"No objects found in bucket '{bucket_name}' for the current filter."
-        else:
-            sample_keys = ", ".join(obj["key"] for obj in objects[:5] if obj.get("key"))
-            summary = f"{len(objects)} object(s) listed. Sample: {sample_keys}"
-        yield self.create_text_message(summary)
+            return f"No objects found in bucket '{bucket_name}' for the current filter."
+        sample_keys = ", ".join(obj["key"] for obj in objects[:5] if obj.get("key"))
+        return f"{len(objects)} object(s) listed. Sample: {sample_keys}"
+
+    def _paginate_contents(self, bucket_name: str, prefix: str, max_items: int) -> list[dict[str, Any]]:
+        """Delimiter なしでプレフィックス配下を最後のページまで（最大 max_items 件）取得する。"""
+
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=bucket_name,
+            Prefix=prefix,
+            PaginationConfig={"MaxItems": max_items, "PageSize": 1000},
+        )
+        return [entry for page in pages for entry in page.get("Contents", []) or []]
+
+    def _list_all_objects(
+        self, bucket_name: str, prefix: str, max_total_keys: int
+    ) -> tuple[list[dict[str, Any]], bool]:
+        """プレフィックス配下の全オブジェクトを取得し、(キー順のエントリ, 上限で打ち切ったか) を返す。
+
+        まず Delimiter="/" で直下のオブジェクトとサブプレフィックスを列挙し、
+        各サブプレフィックスはキー順に一定数ずつ別スレッドで並列にページングし、上限に達したら残りは走査しない。
+        """
+
+        # 1 件多く取得して上限を超えたかどうかを判定する
+        max_items = max_total_keys + 1
+        request_kwargs: dict[str, Any] = {"Bucket": bucket_name, "Delimiter": "/"}
+        if prefix:
+            request_kwargs["Prefix"] = prefix
+
+        entries: list[dict[str, Any]] = []
+        sub_prefixes: list[str] = []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(**request_kwargs, PaginationConfig={"MaxItems": max_items, "PageSize": 1000}):
+            entries.extend(page.get("Contents", []) or [])
+            sub_prefixes.extend(item["Prefix"] for item in page.get("CommonPrefixes", []) or [])
+
+        if sub_prefixes:
+            # サブプレフィックスはキー順に LIST_MAX_CONCURRENCY 件ずつ処理し、上限を超えた時点で打ち切る
+            sub_prefixes.sort()
+            for start in range(0, len(sub_prefixes), LIST_MAX_CONCURRENCY):
+                wave = sub_prefixes[start : start + LIST_MAX_CONCURRENCY]
+                for sub_entries in _LIST_EXECUTOR.map(
+                    lambda sub_prefix: self._paginate_contents(bucket_name, sub_prefix, max_items), wave
+                ):
+                    entries.extend(sub_entries)
+                if start + LIST_MAX_CONCURRENCY >= len(sub_prefixes):
+                    break
+                # 未処理のサブプレフィックスのキーはすべて境界より後ろに並ぶため、境界より前の件数だけで判定できる
+                boundary = sub_prefixes[start + LIST_MAX_CONCURRENCY]
+                if sum(1 for entry in entries if entry["Key"] < boundary) > max_total_keys:
+                    break
+            # 直下とサブプレフィックスの結果を S3 と同じキー順に並べ直す
+            entries.sort(key=itemgetter("Key"))
+
+        return entries[:max_total_keys], len(entries) > max_total_keys
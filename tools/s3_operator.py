@@ -4,20 +4,15 @@
 目的: Dify Workflow から S3 上のテキストファイルを簡単に操作できるようにする。
 """
 
-from typing import Any, Union
-from urllib.parse import urlparse
-
-import boto3
-
 from collections.abc import Generator
 from typing import Any
 
+from botocore.exceptions import BotoCoreError, ClientError
+
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from provider.utils import (
-    resolve_aws_credentials,
-    build_boto3_client_kwargs,
-    reset_clients_on_credential_change,
+    ensure_client,
 )
 
 class S3Operator(Tool):
@@ -28,47 +23,55 @@ class S3Operator(Tool):
         tool_parameters: dict[str, Any],
     ) -> Generator[ToolInvokeMessage]:
         """S3 の read/write 操作を実行し、必要に応じてプリサイン URL を返す."""
+        get = tool_parameters.get
+
+        # S3 URI を解析
+        s3_uri = get("s3_uri")
+        if not s3_uri:
+            yield self.create_text_message("s3_uri parameter is required")
+            return
+
+        # s3://bucket/key を partition で分割する (urlparse は不要)
+        if not s3_uri.startswith("s3://"):
+            yield self.create_text_message("Invalid S3 URI format. Use s3://bucket/key")
+            return
+        bucket, _, key = s3_uri[5:].partition("/")
+        if not bucket or not key:
+            yield self.create_text_message("Invalid S3 URI format. Use s3://bucket/key")
+            return
+
+        operation_type = get("operation_type", "read")
+        generate_presign_url = get("generate_presign_url", False)
         try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters.get("aws_region")
-
-            reset_clients_on_credential_change(self, credentials, ["s3_client"])
-
-            # S3 クライアントを lazy に初期化
-            if not self.s3_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                self.s3_client = boto3.client("s3", **client_kwargs)
+            presign_expiry = int(get("presign_expiry", 3600))  # default 1 hour
+        except (TypeError, ValueError):
+            yield self.create_text_message("presign_expiry must be an integer number of seconds")
+            return
 
-            # S3 URI を解析
-            s3_uri = tool_parameters.get("s3_uri")
-            if not s3_uri:
-                yield self.create_text_message("s3_uri parameter is required")
+        text_content = get("text_content")
+        if operation_type == "write" and not text_content:
+            yield self.create_text_message("text_content parameter is required for write operation")
+            return
 
-            parsed_uri = urlparse(s3_uri)
-            if parsed_uri.scheme != "s3":
-                yield self.create_text_message("Invalid S3 URI format. Must start with 's3://'")
-
-            bucket = parsed_uri.netloc
-            key = parsed_uri.path.lstrip("/")  # 先頭のスラッシュを除去
+        try:
+            self.s3_client, _ = ensure_client(self, tool_parameters, "s3", "s3_client")
+        except (BotoCoreError, ValueError) as exc:  # pragma: no cover - boto3 初期化エラー
+            yield self.create_text_message(f"Failed to initialize AWS client: {exc}")
+            return
 
-            operation_type = tool_parameters.get("operation_type", "read")
-            generate_presign_url = tool_parameters.get("generate_presign_url", False)
-            presign_expiry = int(tool_parameters.get("presign_expiry", 3600))  # default 1 hour
+        # put/get と presign で同じ Bucket/Key 指定を使い回す
+        object_params = {"Bucket": bucket, "Key": key}
 
+        try:
             if operation_type == "write":
-                text_content = tool_parameters.get("text_content")
-                if not text_content:
-                    yield self.create_text_message("text_content parameter is required for write operation")
-
                 # テキストを S3 に書き込む
-                self.s3_client.put_object(Bucket=bucket, Key=key, Body=text_content.encode("utf-8"))
+                self.s3_client.put_object(**object_params, Body=text_content.encode("utf-8"))
                 result = f"s3://{bucket}/{key}"
 
                 # 必要なら書き込んだオブジェクトのプリサイン URL を返す
                 if generate_presign_url:
                     result = self.s3_client.generate_presigned_url(
-                        "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=presign_expiry
+                        "get_object", Params=object_params, ExpiresIn=presign_expiry
                     )
 
             else:  # read operation
@@ -76,19 +79,29 @@ class S3Operator(Tool):
                 if generate_presign_url:
                     # 読み込み用のプリサイン URL を返す
                     result = self.s3_client.generate_presigned_url(
-                        "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=presign_expiry
+                        "get_object", Params=object_params, ExpiresIn=presign_expiry
                     )
-                else: 
+                else:
                     # テキストとして直接取得
-                    response = self.s3_client.get_object(Bucket=bucket, Key=key)
-                    result = response["Body"].read().decode("utf-8")
-
-                # Generate presigned URL if requested
-            yield self.create_text_message(text=result)
+                    response = self.s3_client.get_object(**object_params)
+                    try:
+                        result = response["Body"].read().decode("utf-8")
+                    except UnicodeDecodeError:
+                        yield self.create_text_message(f"Object '{key}' is not UTF-8 text")
+                        return
 
         except self.s3_client.exceptions.NoSuchBucket:
             yield self.create_text_message(f"Bucket '{bucket}' does not exist")
+            return
         except self.s3_client.exceptions.NoSuchKey:
             yield self.create_text_message(f"Object '{key}' does not exist in bucket '{bucket}'")
-        except Exception as e:
-            yield self.create_text_message(f"Exception: {str(e)}")
+            return
+        except ClientError as exc:
+            error_message = exc.response.get("Error", {}).get("Message", str(exc))
+            yield self.create_text_message(f"S3 operation failed: {error_message}")
+            return
+        except BotoCoreError as exc:
+            yield self.create_text_message(f"S3 operation failed: {exc}")
+            return
+
+        yield self.create_text_message(text=result)
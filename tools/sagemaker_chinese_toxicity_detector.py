@@ -24,7 +24,7 @@ class ContentModerationTool(Tool):
     def _invoke_sagemaker(self, payload: dict, endpoint: str):
         response = self.sagemaker_client.invoke_endpoint(
             EndpointName=endpoint,
-            Body=json.dumps(payload),
+            Body=json.dumps(payload, separators=(",", ":")),
             ContentType="application/json",
         )
         # Parse response
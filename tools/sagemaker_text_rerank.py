@@ -4,34 +4,38 @@
 目的: Dify の RAG パイプラインで取得した文書候補を高品質の ReRank モデルで絞り込みたいときに利用する。
 """
 
-import json
+import heapq
 import operator
 from typing import Any, Union
 from collections.abc import Generator
 
-import boto3
+from botocore.exceptions import BotoCoreError, ClientError
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from provider.utils import (
-    resolve_aws_credentials,
-    build_boto3_client_kwargs,
-    reset_clients_on_credential_change,
+    ensure_client,
+    dumps_json_bytes,
+    loads_json,
 )
 
 class SageMakerReRankTool(Tool):
     sagemaker_client: Any = None
     sagemaker_endpoint: str = None
 
-    def _sagemaker_rerank(self, query_input: str, docs: list[str], rerank_endpoint: str):
-        inputs = [query_input] * len(docs)
+    def _sagemaker_rerank(self, query_input: str, docs: list[str], rerank_endpoint: str, pairwise_inputs: bool = True):
+        if pairwise_inputs:
+            # 従来形式: ドキュメントごとにクエリを複製したペアを送る
+            body = {"inputs": [query_input] * len(docs), "docs": docs}
+        else:
+            # クエリを 1 回だけ送る形式 (対応エンドポイント向け)。リクエストサイズとエンコード量を削減する
+            body = {"query": query_input, "docs": docs}
         response_model = self.sagemaker_client.invoke_endpoint(
             EndpointName=rerank_endpoint,
-            Body=json.dumps({"inputs": inputs, "docs": docs}),
+            Body=dumps_json_bytes(body),
             ContentType="application/json",
         )
-        json_str = response_model["Body"].read().decode("utf8")
-        json_obj = json.loads(json_str)
+        json_obj = loads_json(response_model["Body"].read())
         scores = json_obj["scores"]
         return scores if isinstance(scores, list) else [scores]
 
@@ -40,54 +44,52 @@ class SageMakerReRankTool(Tool):
         tool_parameters: dict[str, Any],
     ) -> Generator[ToolInvokeMessage]:
         """入力チェック後に SageMaker リランク API を呼び、結果を JSON で返す."""
-        line = 0
-        try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters.get("aws_region")
-
-            reset_clients_on_credential_change(self, credentials, ["sagemaker_client"])
-
-            if not self.sagemaker_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                self.sagemaker_client = boto3.client("sagemaker-runtime", **client_kwargs)
-
-            line = 1
-            if not self.sagemaker_endpoint:
-                self.sagemaker_endpoint = tool_parameters.get("sagemaker_endpoint")
-
-            line = 2
-            topk = tool_parameters.get("topk", 5)
-
-            line = 3
-            query = tool_parameters.get("query", "")
-            if not query:
-                yield self.create_text_message("Please input query")
+        query = tool_parameters.get("query", "")
+        if not query:
+            yield self.create_text_message("Please input query")
+            return
 
-            line = 4
-            candidate_texts = tool_parameters.get("candidate_texts")
-            if not candidate_texts:
-                yield self.create_text_message("Please input candidate_texts")
+        candidate_texts = tool_parameters.get("candidate_texts")
+        if not candidate_texts:
+            yield self.create_text_message("Please input candidate_texts")
+            return
 
-            line = 5
-            candidate_docs = json.loads(candidate_texts)
+        try:
+            # 上流からリストのまま渡された場合は解析を省略する
+            candidate_docs = candidate_texts if isinstance(candidate_texts, list) else loads_json(candidate_texts)
             docs = [item.get("content") for item in candidate_docs]  # モデル入力用に本文のみ抽出
+            topk = int(tool_parameters.get("topk", 5))
+        except (AttributeError, TypeError, ValueError) as e:
+            yield self.create_text_message(f"Invalid input: {e}")
+            return
 
-            line = 6
-            scores = self._sagemaker_rerank(query_input=query, docs=docs, rerank_endpoint=self.sagemaker_endpoint)
-
-            line = 7
-            for idx in range(len(candidate_docs)):
-                candidate_docs[idx]["score"] = scores[idx]  # 元の構造にスコアを付与
-
-            line = 8
-            sorted_candidate_docs = sorted(candidate_docs, key=operator.itemgetter("score"), reverse=True)
+        try:
+            self.sagemaker_client, _ = ensure_client(self, tool_parameters, "sagemaker-runtime", "sagemaker_client")
+        except (BotoCoreError, ValueError) as e:
+            yield self.create_text_message(f"Failed to initialize AWS client: {e}")
+            return
 
-            line = 9
-            json_result = {
-                "results" : sorted_candidate_docs[:topk]
-            }
-            yield self.create_json_message(json_result)
+        if not self.sagemaker_endpoint:
+            self.sagemaker_endpoint = tool_parameters.get("sagemaker_endpoint")
 
-        except Exception as e:
-            yield self.create_text_message(f"Exception {str(e)}, line : {line}")
+        try:
+            scores = self._sagemaker_rerank(
+                query_input=query,
+                docs=docs,
+                rerank_endpoint=self.sagemaker_endpoint,
+                pairwise_inputs=tool_parameters.get("pairwise_inputs", True) is not False,
+            )
+
+            # 全件ソートせず上位 topk 件だけを O(N log k) で選ぶ (同点は元の順序を維持)
+            top_scored_docs = heapq.nlargest(
+                topk, zip(scores, candidate_docs, strict=True), key=operator.itemgetter(0)
+            )
+        except (BotoCoreError, ClientError, KeyError, ValueError) as e:
+            yield self.create_text_message(f"Exception {str(e)}")
+            return
+
+        # 入力の候補は変更せず、元の構造にスコアを付与したコピーを返す
+        json_result = {
+            "results" : [{**doc, "score": score} for score, doc in top_scored_docs]
+        }
+        yield self.create_json_message(json_result)
@@ -4,22 +4,42 @@
 目的: Dify Workflow からプリセット音声／クローン音声／指示付き音声など複数モードで簡易に音声生成できるようにする。
 """
 
-import json
+import hashlib
+import random
+import time
+import uuid
 from enum import Enum
 from typing import Any, Optional, Union
 from collections.abc import Generator
 
-import boto3
+from botocore.exceptions import ClientError
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from provider.utils import (
-    resolve_aws_credentials,
-    build_boto3_client_kwargs,
-    reset_clients_on_credential_change,
+    TTLCache,
+    ensure_clients,
+    dumps_json_bytes,
+    loads_json,
 )
 
 
+# 非同期推論の出力ポーリング間隔 (秒) と最大待機時間
+SAGEMAKER_ASYNC_POLL_INITIAL_INTERVAL = 1.0
+SAGEMAKER_ASYNC_POLL_MAX_INTERVAL = 15.0
+SAGEMAKER_ASYNC_POLL_BACKOFF = 1.7
+SAGEMAKER_ASYNC_MAX_WAIT_SECONDS = 900
+# 未作成のオブジェクトに対する応答。s3:ListBucket が無いロールでは 404 ではなく 403 になる
+_S3_NOT_READY_STATUS_CODES = frozenset({403, 404})
+
+
+# Comprehend の言語コード -> モデルが期待する言語タグ
+_LANG_TAG_MAP = {"zh": "<|zh|>", "en": "<|en|>", "ja": "<|jp|>", "zh-TW": "<|yue|>", "ko": "<|ko|>"}
+_DEFAULT_LANG_TAG = "<|zh|>"
+# 同じテキストで Comprehend を繰り返し呼ばないよう、本文のハッシュで判定結果を保持する
+_LANG_TAG_CACHE = TTLCache(maxsize=1024, ttl=3600)
+
+
 class TTSModelType(Enum):
     PresetVoice = "PresetVoice"
     CloneVoice = "CloneVoice"
@@ -27,19 +47,37 @@ class TTSModelType(Enum):
     InstructVoice = "InstructVoice"
 
 
+# 呼び出しごとに Enum の属性解決をしないよう、モード名の文字列を保持しておく
+_PRESET_VOICE = TTSModelType.PresetVoice.value
+_CLONE_VOICE = TTSModelType.CloneVoice.value
+_CLONE_VOICE_CROSS_LINGUAL = TTSModelType.CloneVoice_CrossLingual.value
+_INSTRUCT_VOICE = TTSModelType.InstructVoice.value
+
+
 class SageMakerTTSTool(Tool):
     sagemaker_client: Any = None
     sagemaker_endpoint: str | None = None
     s3_client: Any = None
     comprehend_client: Any = None
 
-    def _detect_lang_code(self, content: str, map_dict: Optional[dict] = None):
-        """Comprehend で言語を推定し、モデルが期待する言語タグへ変換する."""
-        map_dict = {"zh": "<|zh|>", "en": "<|en|>", "ja": "<|jp|>", "zh-TW": "<|yue|>", "ko": "<|ko|>"}
+    def _detect_lang_code(self, content: str, lang_tag: Optional[str] = None) -> str:
+        """Comprehend で言語を推定し、モデルが期待する言語タグへ変換する.
+
+        lang_tag (言語コードまたはタグ) が指定されていれば Comprehend は呼ばない。
+        """
+        if lang_tag:
+            return _LANG_TAG_MAP.get(lang_tag, lang_tag)
+
+        cache_key = hashlib.sha1(content.encode("utf-8")).digest()
+        cached = _LANG_TAG_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
 
         response = self.comprehend_client.detect_dominant_language(Text=content)
         language_code = response["Languages"][0]["LanguageCode"]
-        return map_dict.get(language_code, "<|zh|>")
+        detected = _LANG_TAG_MAP.get(language_code, _DEFAULT_LANG_TAG)
+        _LANG_TAG_CACHE.set(cache_key, detected)
+        return detected
 
     def _build_tts_payload(
         self,
@@ -49,16 +87,17 @@ class SageMakerTTSTool(Tool):
         prompt_text: str,
         prompt_audio: str,
         instruct_text: str,
+        lang_tag: Optional[str] = None,
     ):
         # モードに応じたペイロードを生成
-        if model_type == TTSModelType.PresetVoice.value and model_role:
+        if model_type == _PRESET_VOICE and model_role:
             return {"tts_text": content_text, "role": model_role}
-        if model_type == TTSModelType.CloneVoice.value and prompt_text and prompt_audio:
+        if model_type == _CLONE_VOICE and prompt_text and prompt_audio:
             return {"tts_text": content_text, "prompt_text": prompt_text, "prompt_audio": prompt_audio}
-        if model_type == TTSModelType.CloneVoice_CrossLingual.value and prompt_audio:
-            lang_tag = self._detect_lang_code(content_text)
+        if model_type == _CLONE_VOICE_CROSS_LINGUAL and prompt_audio:
+            lang_tag = self._detect_lang_code(content_text, lang_tag)
             return {"tts_text": f"{content_text}", "prompt_audio": prompt_audio, "lang_tag": lang_tag}
-        if model_type == TTSModelType.InstructVoice.value and instruct_text and model_role:
+        if model_type == _INSTRUCT_VOICE and instruct_text and model_role:
             return {"tts_text": content_text, "role": model_role, "instruct_text": instruct_text}
 
         raise RuntimeError(f"Invalid params for {model_type}")
@@ -67,12 +106,68 @@ class SageMakerTTSTool(Tool):
         """SageMaker Runtime へリクエストを送り JSON レスポンスを取得する."""
         response_model = self.sagemaker_client.invoke_endpoint(
             EndpointName=endpoint,
-            Body=json.dumps(payload),
+            Body=dumps_json_bytes(payload),
+            ContentType="application/json",
+        )
+        return loads_json(response_model["Body"].read())
+
+    def _read_s3_object_if_exists(self, s3_uri: str) -> Optional[bytes]:
+        """S3 オブジェクトを取得し、まだ存在しなければ (403/404) None を返す."""
+        bucket, _, key = s3_uri[5:].partition("/")
+        try:
+            return self.s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        except ClientError as exc:
+            if exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode") in _S3_NOT_READY_STATUS_CODES:
+                return None
+            raise
+
+    def _delete_s3_object_quietly(self, bucket: str, key: str) -> None:
+        """推論が終わった入力ペイロードを削除する. 削除できなくても結果の返却は妨げない."""
+        try:
+            self.s3_client.delete_object(Bucket=bucket, Key=key)
+        except ClientError:
+            pass
+
+    def _invoke_sagemaker_async(self, payload: dict, endpoint: str, input_s3_uri: str):
+        """ペイロードを S3 に置いて InvokeEndpointAsync を呼び、出力が書き込まれるまで待つ.
+
+        出力または失敗情報が書き込まれたら入力ペイロードは削除する (タイムアウト時は推論中の可能性があるため残す)。
+        """
+        if not input_s3_uri.startswith("s3://"):
+            raise ValueError("async_input_s3_uri must start with s3://")
+        bucket, _, prefix = input_s3_uri[5:].partition("/")
+        key = f"{prefix.strip('/')}/{uuid.uuid4().hex}.json".lstrip("/")
+        self.s3_client.put_object(
+            Bucket=bucket, Key=key, Body=dumps_json_bytes(payload), ContentType="application/json"
+        )
+
+        response = self.sagemaker_client.invoke_endpoint_async(
+            EndpointName=endpoint,
+            InputLocation=f"s3://{bucket}/{key}",
             ContentType="application/json",
         )
-        json_str = response_model["Body"].read().decode("utf8")
-        json_obj = json.loads(json_str)
-        return json_obj
+        output_location = response["OutputLocation"]
+        failure_location = response.get("FailureLocation")
+
+        # 出力 (または失敗情報) が書き込まれるまで指数バックオフ + ジッターでポーリング
+        deadline = time.monotonic() + SAGEMAKER_ASYNC_MAX_WAIT_SECONDS
+        delay = SAGEMAKER_ASYNC_POLL_INITIAL_INTERVAL
+        while True:
+            time.sleep(delay + random.uniform(0, delay * 0.25))
+            output = self._read_s3_object_if_exists(output_location)
+            if output is not None:
+                self._delete_s3_object_quietly(bucket, key)
+                return loads_json(output)
+            if failure_location:
+                failure = self._read_s3_object_if_exists(failure_location)
+                if failure is not None:
+                    self._delete_s3_object_quietly(bucket, key)
+                    raise RuntimeError(f"Async inference failed: {failure.decode('utf-8', 'replace')}")
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"Async inference did not finish within {SAGEMAKER_ASYNC_MAX_WAIT_SECONDS} seconds: {output_location}"
+                )
+            delay = min(delay * SAGEMAKER_ASYNC_POLL_BACKOFF, SAGEMAKER_ASYNC_POLL_MAX_INTERVAL)
 
     def _invoke(
         self,
@@ -80,22 +175,12 @@ class SageMakerTTSTool(Tool):
     ) -> Generator[ToolInvokeMessage]:
         """音声合成パラメータを組み立て、SageMaker 推論を実行する."""
         try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters.get("aws_region")
-
-            reset_clients_on_credential_change(
+            ensure_clients(
                 self,
-                credentials,
-                ["sagemaker_client", "s3_client", "comprehend_client"],
+                tool_parameters,
+                {"sagemaker_client": "sagemaker-runtime", "s3_client": "s3", "comprehend_client": "comprehend"},
             )
 
-            if not self.sagemaker_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                self.sagemaker_client = boto3.client("sagemaker-runtime", **client_kwargs)
-                self.s3_client = boto3.client("s3", **client_kwargs)
-                self.comprehend_client = boto3.client("comprehend", **client_kwargs)
-
             if not self.sagemaker_endpoint:
                 self.sagemaker_endpoint = tool_parameters.get("sagemaker_endpoint")
 
@@ -107,10 +192,22 @@ class SageMakerTTSTool(Tool):
             mock_voice_text = tool_parameters.get("mock_voice_text")
             voice_instruct_prompt = tool_parameters.get("voice_instruct_prompt")
             payload = self._build_tts_payload(
-                tts_infer_type, tts_text, voice, mock_voice_text, mock_voice_audio, voice_instruct_prompt
+                tts_infer_type,
+                tts_text,
+                voice,
+                mock_voice_text,
+                mock_voice_audio,
+                voice_instruct_prompt,
+                tool_parameters.get("lang_tag"),
             )
 
-            result = self._invoke_sagemaker(payload, self.sagemaker_endpoint)
+            if tool_parameters.get("sagemaker_async"):
+                # 長時間の合成は非同期推論に任せ、60 秒の同期呼び出し上限を回避する
+                result = self._invoke_sagemaker_async(
+                    payload, self.sagemaker_endpoint, tool_parameters.get("async_input_s3_uri") or ""
+                )
+            else:
+                result = self._invoke_sagemaker(payload, self.sagemaker_endpoint)
 
             yield self.create_text_message(text=result["s3_presign_url"])
 
@@ -6,11 +6,9 @@
 
 from __future__ import annotations
 
-import json
 from collections.abc import Generator
 from typing import Any
 
-import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 
 from dify_plugin import Tool
@@ -18,50 +16,48 @@ from dify_plugin.entities.tool import ToolInvokeMessage
 
 try:
     from my_aws_tools.provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        dumps_json_bytes,
+        ensure_client,
+        loads_json,
     )
 except ModuleNotFoundError:  # pragma: no cover
     from provider.utils import (
-        build_boto3_client_kwargs,
-        resolve_aws_credentials,
-        reset_clients_on_credential_change,
+        dumps_json_bytes,
+        ensure_client,
+        loads_json,
     )
 
 
 class StepFunctionsStartExecutionTool(Tool):
     stepfunctions_client: Any | None = None
 
-    def _ensure_client(self, credentials: dict[str, Any]) -> None:
-        reset_clients_on_credential_change(self, credentials, ["stepfunctions_client"])
-        if not self.stepfunctions_client:
-            client_kwargs = build_boto3_client_kwargs(credentials)
-            self.stepfunctions_client = boto3.client("stepfunctions", **client_kwargs)
+    def _parse_json_input(
+        self, value: Any, param_name: str, default: Any
+    ) -> tuple[Any, str | None, str | None]:
+        """JSON 入力を (値, JSON 文字列, エラー) に変換する。
 
-    def _parse_json_input(self, value: Any, param_name: str, default: Any) -> tuple[Any, str | None]:
+        文字列入力は検証だけ行って元の文字列をそのまま使い、dict/list は一度だけエンコードする。
+        """
         if value in (None, ""):
-            return default, None
+            return default, None, None
         if isinstance(value, (dict, list)):
             try:
-                json.dumps(value)
-            except (TypeError, ValueError) as exc:
-                return None, f"{param_name} must be JSON serializable: {exc}"
-            return value, None
+                return value, dumps_json_bytes(value).decode("utf-8"), None
+            except TypeError as exc:
+                return None, None, f"{param_name} must be JSON serializable: {exc}"
         if not isinstance(value, str):
-            return None, f"{param_name} must be a JSON string or object"
+            return None, None, f"{param_name} must be a JSON string or object"
         try:
-            parsed = json.loads(value)
-        except json.JSONDecodeError as exc:
-            return None, f"{param_name} must be valid JSON: {exc}"
-        return parsed, None
+            parsed = loads_json(value)
+        except ValueError as exc:
+            return None, None, f"{param_name} must be valid JSON: {exc}"
+        return parsed, value, None
 
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
         try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters["aws_region"]
-            self._ensure_client(credentials)
+            self.stepfunctions_client, _ = ensure_client(
+                self, tool_parameters, "stepfunctions", "stepfunctions_client"
+            )
         except Exception as exc:  # pragma: no cover - boto3 init failures are rare
             yield self.create_text_message(f"Failed to initialize AWS client: {exc}")
             return
@@ -71,14 +67,16 @@ class StepFunctionsStartExecutionTool(Tool):
             yield self.create_text_message("state_machine_arn parameter is required")
             return
 
-        input_payload, payload_error = self._parse_json_input(tool_parameters.get("input_json"), "input_json", {})
+        input_payload, input_json, payload_error = self._parse_json_input(
+            tool_parameters.get("input_json"), "input_json", {}
+        )
         if payload_error:
             yield self.create_text_message(payload_error)
             return
-        if input_payload is None:
-            input_payload = {}
+        if input_payload is None or input_json is None:
+            input_json = "{}"
 
-        tags, tags_error = self._parse_json_input(tool_parameters.get("tags_json"), "tags_json", None)
+        tags, _, tags_error = self._parse_json_input(tool_parameters.get("tags_json"), "tags_json", None)
         if tags_error:
             yield self.create_text_message(tags_error)
             return
@@ -88,7 +86,7 @@ class StepFunctionsStartExecutionTool(Tool):
 
         start_kwargs: dict[str, Any] = {
             "stateMachineArn": state_machine_arn,
-            "input": json.dumps(input_payload, ensure_ascii=False),
+            "input": input_json,
         }
         if execution_name:
             start_kwargs["name"] = execution_name
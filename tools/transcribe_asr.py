@@ -4,29 +4,36 @@
 目的: Dify から URL だけで音声をアップロードし、スピーカーダイアライゼーション付きテキストを取得できるようにする。
 """
 
-import json
 import logging
 import os
+import random
 import re
+import tempfile
 import time
 import uuid
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
-from typing import Any, Union
+from urllib3.util.retry import Retry
+from typing import Any, Optional, Union
 from urllib.parse import urlparse
 from collections.abc import Generator
 
-import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from provider.utils import (
-    resolve_aws_credentials,
-    build_boto3_client_kwargs,
-    reset_clients_on_credential_change,
+    ensure_clients,
+    loads_json,
 )
 
+try:
+    import ijson  # type: ignore
+except ImportError:  # pragma: no cover - ijson は任意依存
+    ijson = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -137,40 +144,65 @@ LanguageCodeOptions = [
     "zu-ZA",
 ]
 
+# 入力チェック用 (エラーメッセージには順序付きの LanguageCodeOptions を使う)
+_LANGUAGE_CODE_SET = frozenset(LanguageCodeOptions)
+
 MediaFormat = ["mp3", "mp4", "wav", "flac", "ogg", "amr", "webm", "m4a"]
 
+# ジョブ状態のポーリング間隔 (秒)。短いジョブは早く拾い、長いジョブでは上限まで間隔を伸ばす
+TRANSCRIBE_STATUS_CHECK_INITIAL_INTERVAL = 1.0
+TRANSCRIBE_STATUS_CHECK_MAX_INTERVAL = 30.0
+TRANSCRIBE_STATUS_CHECK_BACKOFF = 1.7
+# 同期モードでジョブ完了を待つ最大時間 (秒)
+TRANSCRIBE_DEFAULT_MAX_WAIT_SECONDS = 3600
+# URL から取得した音声をマルチパートで並列に S3 へ流し込む設定
+_TRANSFER_CFG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True,
+)
+
+
+# ijson でストリーム解析する際、これを超えるトランスクリプトはメモリではなく一時ファイルへ退避する
+TRANSCRIPT_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+_TRANSCRIPT_JSON_ERRORS = (ValueError,) if ijson is None else (ValueError, ijson.JSONError)
+
+
+# 音声/トランスクリプト取得用の共有セッション。接続を使い回し、一時的な失敗はアダプター側でリトライする
+_HTTP_RETRY = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504), raise_on_status=False)
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=_HTTP_RETRY))
+_HTTP_SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=_HTTP_RETRY))
+
+# URL 判定用の正規表現 (呼び出しごとにコンパイルしないようモジュールで保持)
+_URL_RE = re.compile(
+    r"^"  # 文字列の先頭
+    r"(?:http|https)://"  # http/https のみ許可
+    r"(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|"  # ドメイン部
+    r"localhost|"  # localhost
+    r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})"  # IPアドレス
+    r"(?::\d+)?"  # 任意のポート
+    r"(?:/?|[/?]\S+)"  # パス
+    r"$",  # 文字列の末尾
+    re.IGNORECASE,
+)
+
 
 def is_url(text):
-    if not text:
-        return False
-    text = text.strip()
-    # URL 判定用の正規表現
-    pattern = re.compile(
-        r"^"  # 文字列の先頭
-        r"(?:http|https)://"  # http/https のみ許可
-        r"(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|"  # ドメイン部
-        r"localhost|"  # localhost
-        r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})"  # IPアドレス
-        r"(?::\d+)?"  # 任意のポート
-        r"(?:/?|[/?]\S+)"  # パス
-        r"$",  # 文字列の末尾
-        re.IGNORECASE,
-    )
-    return bool(pattern.match(text))
-
-
-def upload_file_from_url_to_s3(s3_client, url, bucket_name, s3_key=None, max_retries=3):
-    """URL からファイルを取得し、S3 へアップロードする（リトライ付き）。"""
+    return bool(_URL_RE.match(text.strip())) if text else False
+
+
+def upload_file_from_url_to_s3(s3_client, url, bucket_name, s3_key=None):
+    """URL からファイルを取得し、S3 へアップロードする（リトライは共有セッションのアダプターが行う）。"""
 
     # 入力パラメータのバリデーション
     if not url or not bucket_name:
         return False, "URL and bucket name are required"
 
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            # URL からファイルをダウンロード
-            response = requests.get(url, stream=True, timeout=30)
+    try:
+        # URL からファイルをダウンロード
+        with _HTTP_SESSION.get(url, stream=True, timeout=30) as response:
             response.raise_for_status()
 
             # s3_key が無ければ URL からファイル名を推測
@@ -179,7 +211,8 @@ def upload_file_from_url_to_s3(s3_client, url, bucket_name, s3_key=None, max_ret
                 filename = os.path.basename(parsed_url.path.split("/file-preview")[0])
                 s3_key = "transcribe-files/" + filename
 
-            # S3 へアップロード
+            # Content-Encoding が付いていても展開後のバイト列をそのまま S3 へアップロード
+            response.raw.decode_content = True
             s3_client.upload_fileobj(
                 response.raw,
                 bucket_name,
@@ -188,23 +221,89 @@ def upload_file_from_url_to_s3(s3_client, url, bucket_name, s3_key=None, max_ret
                     "ContentType": response.headers.get("content-type"),
                     "ACL": "private",  # 常に private で保存
                 },
+                Config=_TRANSFER_CFG,
             )
 
-            return f"s3://{bucket_name}/{s3_key}", f"Successfully uploaded file to s3://{bucket_name}/{s3_key}"
+        return f"s3://{bucket_name}/{s3_key}", f"Successfully uploaded file to s3://{bucket_name}/{s3_key}"
+
+    except RequestException as e:
+        return None, f"Failed to download file from URL: {str(e)}"
+
+    except ClientError as e:
+        return None, f"AWS S3 error: {str(e)}"
 
-        except RequestException as e:
-            retry_count += 1
-            if retry_count == max_retries:
-                return None, f"Failed to download file from URL after {max_retries} attempts: {str(e)}"
+    except Exception as e:
+        return None, f"Unexpected error: {str(e)}"
+
+
+def _format_speaker_transcript(items, time_to_speaker: dict) -> str:
+    """単語リストを start_time で話者に対応付け、話者ラベル付きの文字列を構築する."""
+    current_speaker = None
+    transcript_parts = []
+
+    for item in items:
+        content = item["alternatives"][0]["content"]
+        # 句読点は直前の単語に空白を挟まず連結する
+        if item["type"] == "punctuation":
+            transcript_parts.append(content)
             continue
 
-        except ClientError as e:
-            return None, f"AWS S3 error: {str(e)}"
+        speaker = time_to_speaker.get(item["start_time"])
+
+        if speaker != current_speaker:
+            current_speaker = speaker
+            transcript_parts.append(f"\n[{speaker}]:")
+
+        # 単語の前にだけ空白を 1 つ入れる
+        transcript_parts.append(" ")
+        transcript_parts.append(content)
+
+    return "".join(transcript_parts).strip()
+
+
+def _read_transcript_data(transcript_data: dict) -> tuple[Optional[str], Optional[str]]:
+    """パース済みのトランスクリプト JSON から本文を取り出す."""
+    results = transcript_data.get("results", {})
+
+    # スピーカーダイアライゼーションが存在する場合は話者ラベル付きで整形
+    if "segments" in results.get("speaker_labels", {}):
+        time_to_speaker = {
+            item["start_time"]: segment["speaker_label"]
+            for segment in results["speaker_labels"]["segments"]
+            for item in segment["items"]
+        }
+        return _format_speaker_transcript(results["items"], time_to_speaker), None
+
+    # 通常のテキストは results -> transcripts 配列に含まれる
+    transcripts = results.get("transcripts")
+    if transcripts:
+        # 各セグメントを結合
+        return " ".join(t.get("transcript", "") for t in transcripts), None
+
+    return None, "No transcripts found in the response"
 
-        except Exception as e:
-            return None, f"Unexpected error: {str(e)}"
 
-    return None, "Maximum retries exceeded"
+def _read_transcript_stream(spool) -> tuple[Optional[str], Optional[str]]:
+    """一時ファイル上のトランスクリプト JSON を ijson で要素ごとに読み、本文を取り出す.
+
+    ijson は巻き戻せないため、セグメント・単語・transcripts の各配列ごとに先頭から読み直す。
+    """
+    spool.seek(0)
+    time_to_speaker = {
+        item["start_time"]: segment["speaker_label"]
+        for segment in ijson.items(spool, "results.speaker_labels.segments.item")
+        for item in segment["items"]
+    }
+    if time_to_speaker:
+        spool.seek(0)
+        return _format_speaker_transcript(ijson.items(spool, "results.items.item"), time_to_speaker), None
+
+    spool.seek(0)
+    transcripts = [t.get("transcript", "") for t in ijson.items(spool, "results.transcripts.item")]
+    if transcripts:
+        return " ".join(transcripts), None
+
+    return None, "No transcripts found in the response"
 
 
 class TranscribeTool(Tool):
@@ -213,105 +312,71 @@ class TranscribeTool(Tool):
 
     """LanguageCode / IdentifyLanguage / IdentifyMultipleLanguages のうち 1 つのみ指定する必要がある。"""
 
-    def _transcribe_audio(self, audio_file_uri, file_type, **extra_args):
-        uuid_str = str(uuid.uuid4())
-        job_name = f"{int(time.time())}-{uuid_str}"
+    def _start_transcription_job(self, audio_file_uri, **extra_args) -> str:
+        """Transcribe ジョブを起動し、ジョブ名を返す."""
+        job_name = f"{int(time.time())}-{uuid.uuid4()}"
+        self.transcribe_client.start_transcription_job(
+            TranscriptionJobName=job_name, Media={"MediaFileUri": audio_file_uri}, **extra_args
+        )
+        return job_name
+
+    def _get_transcription_status(self, job_name: str) -> tuple[str, Optional[str], Optional[str]]:
+        """ジョブ状態を 1 回だけ取得し、(状態, トランスクリプト URI, 失敗理由) を返す."""
+        job = self.transcribe_client.get_transcription_job(TranscriptionJobName=job_name)["TranscriptionJob"]
+        status = job["TranscriptionJobStatus"]
+        transcript_file_uri = job.get("Transcript", {}).get("TranscriptFileUri") if status == "COMPLETED" else None
+        return status, transcript_file_uri, job.get("FailureReason")
+
+    def _transcribe_audio(self, audio_file_uri, file_type, max_wait_seconds=TRANSCRIBE_DEFAULT_MAX_WAIT_SECONDS, **extra_args):
         try:
             # Transcribe ジョブを起動
-            response = self.transcribe_client.start_transcription_job(
-                TranscriptionJobName=job_name, Media={"MediaFileUri": audio_file_uri}, **extra_args
-            )
+            job_name = self._start_transcription_job(audio_file_uri, **extra_args)
 
-            # 完了するまでポーリング
+            # 完了するまで指数バックオフ + ジッターでポーリング (max_wait_seconds で打ち切る)
+            deadline = time.monotonic() + max_wait_seconds
+            delay = TRANSCRIBE_STATUS_CHECK_INITIAL_INTERVAL
             while True:
-                status = self.transcribe_client.get_transcription_job(TranscriptionJobName=job_name)
-                if status["TranscriptionJob"]["TranscriptionJobStatus"] in ["COMPLETED", "FAILED"]:
+                time.sleep(delay + random.uniform(0, delay * 0.25))
+                status, transcript_file_uri, failure_reason = self._get_transcription_status(job_name)
+                if status in ["COMPLETED", "FAILED"]:
                     break
-                time.sleep(5)
+                if time.monotonic() >= deadline:
+                    return None, f"Error: TranscriptionJob {job_name} did not finish within {max_wait_seconds} seconds"
+                delay = min(delay * TRANSCRIBE_STATUS_CHECK_BACKOFF, TRANSCRIBE_STATUS_CHECK_MAX_INTERVAL)
 
-            if status["TranscriptionJob"]["TranscriptionJobStatus"] == "COMPLETED":
-                return status["TranscriptionJob"]["Transcript"]["TranscriptFileUri"], None
+            if status == "COMPLETED":
+                return transcript_file_uri, None
             else:
-                return None, f"Error: TranscriptionJobStatus:{status['TranscriptionJob']['TranscriptionJobStatus']} "
+                return None, f"Error: TranscriptionJobStatus:{status} {failure_reason or ''}"
 
         except Exception as e:
             return None, f"Error: {str(e)}"
 
-    def _download_and_read_transcript(self, transcript_file_uri: str, max_retries: int = 3) -> tuple[str, str]:
+    def _download_and_read_transcript(self, transcript_file_uri: str) -> tuple[str, str]:
         """トランスクリプトの JSON を取得し、必要に応じて話者ラベル付き文字列へ整形する."""
-        retry_count = 0
-        while retry_count < max_retries:
-            try:
-                # Transcribe が返した URI から JSON を取得
-                response = requests.get(transcript_file_uri, timeout=30)
+        try:
+            if ijson is None:
+                # Transcribe が返した URI から JSON を取得してパース
+                with _HTTP_SESSION.get(transcript_file_uri, timeout=30) as response:
+                    response.raise_for_status()
+                    return _read_transcript_data(loads_json(response.content))
+
+            # ijson があれば一時ファイルへ流し込み、全体を dict 化せずに要素単位で解析する
+            with _HTTP_SESSION.get(transcript_file_uri, stream=True, timeout=30) as response:
                 response.raise_for_status()
+                with tempfile.SpooledTemporaryFile(max_size=TRANSCRIPT_SPOOL_MAX_SIZE) as spool:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        spool.write(chunk)
+                    return _read_transcript_stream(spool)
 
-                # JSON をパース
-                transcript_data = response.json()
-
-                # スピーカーダイアライゼーションが存在するか確認
-                has_speaker_labels = (
-                    "results" in transcript_data
-                    and "speaker_labels" in transcript_data["results"]
-                    and "segments" in transcript_data["results"]["speaker_labels"]
-                )
-
-                if has_speaker_labels:
-                    # 話者セグメントと単語リストを取得
-                    segments = transcript_data["results"]["speaker_labels"]["segments"]
-                    items = transcript_data["results"]["items"]
-
-                    # start_time と speaker_label の対応表を作る
-                    time_to_speaker = {}
-                    for segment in segments:
-                        speaker_label = segment["speaker_label"]
-                        for item in segment["items"]:
-                            time_to_speaker[item["start_time"]] = speaker_label
-
-                    # 話者ラベル付きの文字列を構築
-                    current_speaker = None
-                    transcript_parts = []
-
-                    for item in items:
-                        # 句読点など発話以外はそのまま追加
-                        if item["type"] == "punctuation":
-                            transcript_parts.append(item["alternatives"][0]["content"])
-                            continue
-
-                        start_time = item["start_time"]
-                        speaker = time_to_speaker.get(start_time)
-
-                        if speaker != current_speaker:
-                            current_speaker = speaker
-                            transcript_parts.append(f"\n[{speaker}]: ")
+        except requests.exceptions.RequestException as e:
+            return None, f"Failed to download transcript file: {str(e)}"
 
-                        transcript_parts.append(item["alternatives"][0]["content"])
+        except _TRANSCRIPT_JSON_ERRORS as e:
+            return None, f"Failed to parse transcript JSON: {str(e)}"
 
-                    return " ".join(transcript_parts).strip(), None
-                else:
-                    # 通常のテキストは results -> transcripts 配列に含まれる
-                    if "results" in transcript_data and "transcripts" in transcript_data["results"]:
-                        transcripts = transcript_data["results"]["transcripts"]
-                        if transcripts:
-                            # 各セグメントを結合
-                            full_text = " ".join(t.get("transcript", "") for t in transcripts)
-                            return full_text, None
-
-                return None, "No transcripts found in the response"
-
-            except requests.exceptions.RequestException as e:
-                retry_count += 1
-                if retry_count == max_retries:
-                    return None, f"Failed to download transcript file after {max_retries} attempts: {str(e)}"
-                continue
-
-            except json.JSONDecodeError as e:
-                return None, f"Failed to parse transcript JSON: {str(e)}"
-
-            except Exception as e:
-                return None, f"Unexpected error while processing transcript: {str(e)}"
-
-        return None, "Maximum retries exceeded"
+        except Exception as e:
+            return None, f"Unexpected error while processing transcript: {str(e)}"
 
     def _invoke(
         self,
@@ -321,22 +386,20 @@ class TranscribeTool(Tool):
         invoke tools
         """
         try:
-            credentials = resolve_aws_credentials(self, tool_parameters)
-            if tool_parameters.get("aws_region"):
-                credentials["aws_region"] = tool_parameters.get("aws_region")
-
-            reset_clients_on_credential_change(
-                self,
-                credentials,
-                ["transcribe_client", "s3_client"],
-            )
-
-            if not self.transcribe_client or not self.s3_client:
-                client_kwargs = build_boto3_client_kwargs(credentials)
-                if not self.transcribe_client:
-                    self.transcribe_client = boto3.client("transcribe", **client_kwargs)
-                if not self.s3_client:
-                    self.s3_client = boto3.client("s3", **client_kwargs)
+            ensure_clients(self, tool_parameters, {"transcribe_client": "transcribe", "s3_client": "s3"})
+
+            # job_name が指定された場合は既存ジョブの状態を 1 回だけ確認する
+            job_name = tool_parameters.get("job_name")
+            if job_name:
+                status, transcript_file_uri, failure_reason = self._get_transcription_status(job_name)
+                if status == "COMPLETED":
+                    transcript_text, error = self._download_and_read_transcript(transcript_file_uri)
+                    yield self.create_text_message(text=transcript_text or error)
+                elif status == "FAILED":
+                    yield self.create_text_message(text=f"Error: TranscriptionJobStatus:{status} {failure_reason or ''}")
+                else:
+                    yield self.create_text_message(text=f"TranscriptionJob {job_name} is {status}")
+                return
 
             file_url = tool_parameters.get("file_url")
             file_type = tool_parameters.get("file_type")
@@ -348,20 +411,26 @@ class TranscribeTool(Tool):
             ShowSpeakerLabels = tool_parameters.get("ShowSpeakerLabels", True)
             MaxSpeakerLabels = tool_parameters.get("MaxSpeakerLabels", 2)
 
-            # 入力パラメータの整合性チェック
+            # 入力パラメータの整合性チェック (不正な入力ではアップロードもジョブ起動も行わない)
+            if not file_url:
+                yield self.create_text_message(text="file_url is required unless job_name is specified")
+                return
             if not s3_bucket_name:
                 yield self.create_text_message(text="s3_bucket_name is required")
+                return
             language_options = None
             if language_options_str:
                 language_options = language_options_str.split("|")
                 for lang in language_options:
-                    if lang not in LanguageCodeOptions:
+                    if lang not in _LANGUAGE_CODE_SET:
                         yield self.create_text_message(
                             text=f"{lang} is not supported, should be one of {LanguageCodeOptions}"
                         )
-            if language_code and language_code not in LanguageCodeOptions:
+                        return
+            if language_code and language_code not in _LANGUAGE_CODE_SET:
                 err_msg = f"language_code:{language_code} is not supported, should be one of {LanguageCodeOptions}"
                 yield self.create_text_message(text=err_msg)
+                return
 
             err_msg = f"identify_language:{identify_language}, \
                 identify_multiple_languages:{identify_multiple_languages}, \
@@ -372,9 +441,11 @@ class TranscribeTool(Tool):
             if not language_code:
                 if identify_language and identify_multiple_languages:
                     yield self.create_text_message(text=err_msg)
+                    return
             else:
                 if identify_language or identify_multiple_languages:
                     yield self.create_text_message(text=err_msg)
+                    return
 
             extra_args = {
                 "IdentifyLanguage": identify_language,
@@ -387,23 +458,33 @@ class TranscribeTool(Tool):
             if ShowSpeakerLabels:
                 extra_args["Settings"] = {"ShowSpeakerLabels": ShowSpeakerLabels, "MaxSpeakerLabels": MaxSpeakerLabels}
 
-            # S3 バケットへファイルをアップロード
+            # S3 バケットへアップロード
             s3_path_result, error = upload_file_from_url_to_s3(self.s3_client, url=file_url, bucket_name=s3_bucket_name)
             if not s3_path_result:
                 yield self.create_text_message(text=error)
+                return
+
+            if tool_parameters.get("async", False):
+                # 非同期モードではジョブ名だけ返し、job_name を指定した再実行で結果を取得する
+                job_name = self._start_transcription_job(s3_path_result, **extra_args)
+                yield self.create_text_message(text=f"Transcription job started.\nJob name: {job_name}")
+                return
 
             transcript_file_uri, error = self._transcribe_audio(
                 audio_file_uri=s3_path_result,
                 file_type=file_type,
+                max_wait_seconds=int(tool_parameters.get("max_wait_seconds") or TRANSCRIBE_DEFAULT_MAX_WAIT_SECONDS),
                 **extra_args,
             )
             if not transcript_file_uri:
                 yield self.create_text_message(text=error)
+                return
 
             # 生成されたトランスクリプトをダウンロードして読み込む
             transcript_text, error = self._download_and_read_transcript(transcript_file_uri)
             if not transcript_text:
                 yield self.create_text_message(text=error)
+                return
 
             yield self.create_text_message(text=transcript_text)
 